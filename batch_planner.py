@@ -0,0 +1,118 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from depth_anything_v2.util.preprocess import get_input_shape
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# JPEG 可以在 DCT 域按 1/2、1/4、1/8 缩小解码
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def scan_images(directory, recursive=True, exclude=()):
+    """用 os.scandir 遍历目录，返回排序后的图片路径列表。exclude 中的目录会被跳过。"""
+    exclude = {os.path.normcase(os.path.abspath(d)) for d in exclude}
+    image_paths = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in exclude:
+                        pending.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    image_paths.append(entry.path)
+    image_paths.sort()
+    return image_paths
+
+
+def read_image_size(image_path):
+    """只读取文件头获取 (width, height)，不解码像素数据。"""
+    try:
+        with Image.open(image_path) as image:
+            return image.size
+    except Exception as e:
+        print(f"读取图像尺寸失败: {image_path}: {e}")
+        return None
+
+
+def reduction_factor(image_path, width, height, input_size=518):
+    """
+    返回解码 JPEG 时可用的最大缩小倍数 (1/2/4/8)：缩小后的宽高仍不小于推理输入尺寸，
+    因此送入模型的图像不会比完整解码再缩放时更模糊。非 JPEG 返回 1。
+    """
+    if not image_path.lower().endswith(('.jpg', '.jpeg')):
+        return 1
+    input_height, input_width = get_input_shape(height, width, input_size)
+    for factor in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if width // factor >= input_width and height // factor >= input_height:
+            return factor
+    return 1
+
+
+def read_image(image_path, factor=1):
+    """解码图像（支持中文路径）；factor > 1 时按 1/factor 缩小解码（BGR），否则原样解码。"""
+    if factor in REDUCED_DECODE_FLAGS:
+        # 与 IMREAD_UNCHANGED 一致，不按 EXIF 方向旋转，保证宽高与原图对应
+        flags = REDUCED_DECODE_FLAGS[factor] | cv2.IMREAD_IGNORE_ORIENTATION
+    else:
+        flags = cv2.IMREAD_UNCHANGED
+    return cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), flags)
+
+
+def read_inference_image(image_path, input_size=518, size_fn=None, reduce=True):
+    """
+    按推理尺寸读取图像，返回 (image, (height, width), factor)。
+
+    大尺寸 JPEG 只解码到够用的 1/2、1/4 或 1/8 分辨率，(height, width) 始终为原图尺寸，
+    用于把深度图插值回原始大小；需要全分辨率彩色图时再用 read_image(image_path) 单独解码。
+    size_fn 同 plan_batches，用于按裁剪后实际送入推理的尺寸选择缩小倍数。
+    reduce=False 时总是完整解码（分块推理需要原图细节）。
+    """
+    size = read_image_size(image_path)
+    factor = 1
+    if size is not None and reduce:
+        width, height = size if size_fn is None else size_fn(*size)
+        factor = reduction_factor(image_path, width, height, input_size)
+    image = read_image(image_path, factor)
+    if image is None:
+        raise ValueError(f"无法解码图像: {image_path}")
+    if size is None:
+        size = (image.shape[1], image.shape[0])
+    return image, (size[1], size[0]), factor
+
+
+def plan_batches(image_paths, input_size=518, batch_size=4, size_fn=None):
+    """
+    按推理输入尺寸对图片分桶，并把每个桶切分为不超过 batch_size 的批次。
+
+    同一批次内的图片经过 Resize(ensure_multiple_of=14) 后尺寸完全一致，
+    可以直接堆叠推理，无需填充。size_fn 可将原始 (width, height) 映射为
+    实际送入推理的尺寸（例如强制 9:16 裁剪后的尺寸）。
+    返回 (batches, skipped)，skipped 为无法读取尺寸的文件。
+    """
+    buckets = {}
+    skipped = []
+    for image_path in image_paths:
+        size = read_image_size(image_path)
+        if size is None:
+            skipped.append(image_path)
+            continue
+        if size_fn is not None:
+            size = size_fn(*size)
+        width, height = size
+        buckets.setdefault(get_input_shape(height, width, input_size), []).append(image_path)
+
+    batches = []
+    for shape in sorted(buckets):
+        paths = buckets[shape]
+        for start in range(0, len(paths), batch_size):
+            batches.append(paths[start:start + batch_size])
+    return batches, skipped
@@ -0,0 +1,74 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from batch_planner import read_image, scan_images
+from depth_model import load_model, normalize_depth
+
+
+def load_inputs(image_directory, count, size=(720, 1280)):
+    """读取目录中的前 count 张图片；没有给出目录时生成固定随机种子的测试图像。"""
+    if image_directory:
+        images = [read_image(path) for path in scan_images(image_directory)[:count]]
+        return [image for image in images if image is not None]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size + (3,), dtype=np.uint8) for _ in range(count)]
+
+
+def run(model, images, input_size, runs):
+    """返回每张图的深度输出（首轮）和每张图的平均推理耗时（秒，不含预热）。"""
+    depths = [model.infer_image(image, input_size) for image in images] # 预热
+    start = time.perf_counter()
+    for _ in range(runs):
+        for image in images:
+            model.infer_image(image, input_size)
+    return depths, (time.perf_counter() - start) / (runs * len(images))
+
+
+def compare(reference, candidate):
+    """对归一化到 0-1 的深度比较：平均绝对误差、最大绝对误差和皮尔逊相关系数。"""
+    mae, max_error, correlation = [], [], []
+    for ref, out in zip(reference, candidate):
+        ref = normalize_depth(ref, np.float32)
+        out = normalize_depth(out, np.float32)
+        diff = np.abs(ref - out)
+        mae.append(diff.mean())
+        max_error.append(diff.max())
+        correlation.append(np.corrcoef(ref.ravel(), out.ravel())[0, 1])
+    return float(np.mean(mae)), float(np.max(max_error)), float(np.min(correlation))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 上对比 int8 动态量化与 fp32 推理的精度与速度。")
+    parser.add_argument('-w', '--weights', type=str, action='append', required=True,
+                        help="编码器=权重路径，如 vits=depth_anything_v2_vits.safetensors，可重复指定。")
+    parser.add_argument('-i', '--images', type=str, help="测试图片目录（默认使用随机图像）。")
+    parser.add_argument('--count', type=int, default=4, help="测试图片数量。")
+    parser.add_argument('--input_size', type=int, default=518, help="推理输入分辨率。")
+    parser.add_argument('--runs', type=int, default=3, help="计时轮数。")
+    parser.add_argument('--threads', type=int, help="torch CPU 线程数。")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    images = load_inputs(args.images, args.count)
+    print(f"{len(images)} images, input_size={args.input_size}, {torch.get_num_threads()} threads")
+
+    results = []
+    for spec in args.weights:
+        encoder, weights_path = spec.split('=', 1)
+        reference, fp32_time = run(load_model(encoder, weights_path, 'cpu', 'fp32'), images, args.input_size, args.runs)
+        quantized, int8_time = run(load_model(encoder, weights_path, 'cpu', 'int8'), images, args.input_size, args.runs)
+        mae, max_error, correlation = compare(reference, quantized)
+        results.append((encoder, fp32_time, int8_time, mae, max_error, correlation))
+
+    print(f"{'encoder':<8}{'fp32 ms':>10}{'int8 ms':>10}{'speedup':>9}{'MAE':>9}{'max err':>9}{'min corr':>10}")
+    for encoder, fp32_time, int8_time, mae, max_error, correlation in results:
+        print(f"{encoder:<8}{fp32_time * 1000:>10.1f}{int8_time * 1000:>10.1f}{fp32_time / int8_time:>8.2f}x"
+              f"{mae:>9.4f}{max_error:>9.4f}{correlation:>10.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+
+import numpy as np
+
+from depth_render import create_renderer, load_config_yaml
+
+# 交织参数中与渲染结果无关的项（文件路径、着色器路径、后端）
+IGNORED_PARAMS = ('image_file', 'depth_file', 'output_file', 'backend',
+                  'vertex_shader_path', 'fragment_shader_path', 'blur_shader_path')
+
+
+def make_test_pair(width=960, height=1280, seed=0):
+    """生成固定随机种子的测试彩色图 (RGB uint8) 与 16 位深度图：渐变加噪声，深度为若干高斯凸起。"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    u, v = x / width, y / height
+    image = np.stack([u, v, 1.0 - u * v], axis=-1) * 200.0 + rng.integers(0, 56, (height, width, 3))
+    depth = np.zeros((height, width), dtype=np.float32)
+    for cx, cy, radius in rng.uniform(0.1, 0.9, (6, 3)):
+        depth += np.exp(-((u - cx) ** 2 + (v - cy) ** 2) / (2 * (radius * 0.3) ** 2))
+    depth = (depth - depth.min()) / (depth.max() - depth.min())
+    return image.astype(np.uint8), (depth * 65535.0 + 0.5).astype(np.uint16)
+
+
+def compare(reference, candidate):
+    """返回 (最大差值, 差值超过 0 的像素比例)，按 RGBA 各通道的 8 位值比较。"""
+    diff = np.abs(reference.astype(np.int16) - candidate.astype(np.int16))
+    return int(diff.max()), float(np.count_nonzero(diff.max(axis=-1)) / diff[..., 0].size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用同一组彩色/深度图分别以 OpenGL 与 NumPy 后端渲染交织图，检查两者一致（误差不超过 1 LSB）。")
+    parser.add_argument('-c', '--config', type=str, default="depth_config.yaml", help="交织参数配置 (YAML)。")
+    parser.add_argument('-i', '--image_file', type=str, help="彩色图路径（默认使用固定的测试图）。")
+    parser.add_argument('-d', '--depth_file', type=str, help="深度图路径（默认使用固定的测试深度）。")
+    parser.add_argument('--output_width', type=int, default=720, help="输出宽度。")
+    parser.add_argument('--output_height', type=int, default=1280, help="输出高度。")
+    parser.add_argument('--tolerance', type=int, default=1, help="允许的最大 8 位差值。")
+    args = parser.parse_args()
+
+    params = {k: v for k, v in (load_config_yaml(args.config) or {}).items() if k not in IGNORED_PARAMS}
+    params.update(output_width=args.output_width, output_height=args.output_height, output_file=None)
+    if args.image_file and args.depth_file:
+        image, depth = args.image_file, args.depth_file
+    else:
+        image, depth = make_test_pair()
+
+    outputs = {}
+    for backend in ('gl', 'cpu'):
+        renderer = create_renderer(backend=backend)
+        try:
+            outputs[backend] = renderer.render(image, depth, **params)
+        finally:
+            renderer.release()
+        if outputs[backend] is None:
+            raise SystemExit(f"{backend} 后端加载图像失败")
+
+    max_diff, mismatched = compare(outputs['gl'], outputs['cpu'])
+    print(f"max diff {max_diff} LSB, {mismatched * 100:.4f}% pixels differ")
+    if max_diff > args.tolerance:
+        raise SystemExit(f"GL 与 CPU 渲染结果不一致：最大差值 {max_diff} > {args.tolerance}")
+    print("GL 与 CPU 渲染结果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@
 #   https://github.com/facebookresearch/dino/blob/main/vision_transformer.py
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/models/vision_transformer.py
 
+from collections import OrderedDict
 from functools import partial
 import math
 import logging
@@ -18,6 +19,7 @@ import torch.utils.checkpoint
 from torch.nn.init import trunc_normal_
 
 from .dinov2_layers import Mlp, PatchEmbed, SwiGLUFFNFused, MemEffAttention, NestedTensorBlock as Block
+from .util.precision import disable_autocast
 
 
 logger = logging.getLogger("dinov2")
@@ -108,6 +110,10 @@ class DinoVisionTransformer(nn.Module):
 
         self.cls_token = nn.Parameter(torch.zeros(1, 1, embed_dim))
         self.pos_embed = nn.Parameter(torch.zeros(1, num_patches + self.num_tokens, embed_dim))
+        # LRU cache of interpolated position embeddings, see interpolate_pos_encoding
+        self.pos_embed_cache_size = 8
+        self._pos_embed_cache = OrderedDict()
+        self._pos_embed_cache_state = None
         assert num_register_tokens >= 0
         self.register_tokens = (
             nn.Parameter(torch.zeros(1, num_register_tokens, embed_dim)) if num_register_tokens else None
@@ -177,11 +183,40 @@ class DinoVisionTransformer(nn.Module):
         named_apply(init_weights_vit_timm, self)
 
     def interpolate_pos_encoding(self, x, w, h):
-        previous_dtype = x.dtype
         npatch = x.shape[1] - 1
         N = self.pos_embed.shape[1] - 1
         if npatch == N and w == h:
             return self.pos_embed
+        # The bicubic resize only depends on the patch grid, so cache it per
+        # (grid, dtype, device). Not while tracing/exporting (the graph must
+        # contain the computation) or when gradients flow into pos_embed.
+        if (
+            self.pos_embed_cache_size <= 0
+            or torch.jit.is_tracing()
+            or torch.jit.is_scripting()
+            or torch.onnx.is_in_onnx_export()
+            or (torch.is_grad_enabled() and self.pos_embed.requires_grad)
+        ):
+            return self._interpolate_pos_encoding(x, w, h)
+        # load_state_dict bumps the parameter version and .to()/.half() swap its storage
+        state = (self.pos_embed._version, self.pos_embed.data_ptr())
+        if state != self._pos_embed_cache_state:
+            self._pos_embed_cache.clear()
+            self._pos_embed_cache_state = state
+        key = (w // self.patch_size, h // self.patch_size, x.dtype, x.device)
+        pos_embed = self._pos_embed_cache.get(key)
+        if pos_embed is None:
+            pos_embed = self._interpolate_pos_encoding(x, w, h)
+            self._pos_embed_cache[key] = pos_embed
+            while len(self._pos_embed_cache) > self.pos_embed_cache_size:
+                self._pos_embed_cache.popitem(last=False)
+        else:
+            self._pos_embed_cache.move_to_end(key)
+        return pos_embed
+
+    def _interpolate_pos_encoding(self, x, w, h):
+        previous_dtype = x.dtype
+        N = self.pos_embed.shape[1] - 1
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
         patch_pos_embed = pos_embed[:, 1:]
@@ -195,17 +230,25 @@ class DinoVisionTransformer(nn.Module):
         # w0, h0 = w0 + 0.1, h0 + 0.1
         
         sqrt_N = math.sqrt(N)
-        sx, sy = float(w0) / sqrt_N, float(h0) / sqrt_N
-        patch_pos_embed = nn.functional.interpolate(
-            patch_pos_embed.reshape(1, int(sqrt_N), int(sqrt_N), dim).permute(0, 3, 1, 2),
-            scale_factor=(sx, sy),
-            # (int(w0), int(h0)), # to solve the upsampling shape issue
-            mode="bicubic",
-            antialias=self.interpolate_antialias
-        )
+        if torch.jit.is_tracing() or torch.onnx.is_in_onnx_export():
+            # a float scale_factor would be frozen into the graph; the target grid
+            # keeps exported models valid for any input size
+            resize = dict(size=(w // self.patch_size, h // self.patch_size))
+        else:
+            resize = dict(scale_factor=(float(w0) / sqrt_N, float(h0) / sqrt_N))
+        # keep the bicubic resampling in float32 even inside an autocast region
+        with disable_autocast(x.device.type):
+            patch_pos_embed = nn.functional.interpolate(
+                patch_pos_embed.reshape(1, int(sqrt_N), int(sqrt_N), dim).permute(0, 3, 1, 2),
+                # (int(w0), int(h0)), # to solve the upsampling shape issue
+                mode="bicubic",
+                antialias=self.interpolate_antialias,
+                **resize
+            )
         
-        assert int(w0) == patch_pos_embed.shape[-2]
-        assert int(h0) == patch_pos_embed.shape[-1]
+        if not torch.jit.is_tracing():
+            assert int(w0) == patch_pos_embed.shape[-2]
+            assert int(h0) == patch_pos_embed.shape[-1]
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
         return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
 
@@ -9,7 +9,12 @@
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/models/vision_transformer.py
 
 import logging
+import math
+import os
+from typing import Callable, Dict, Optional
 
+import torch
+import torch.nn.functional as F
 from torch import Tensor
 from torch import nn
 
@@ -25,6 +30,149 @@ except ImportError:
     logger.warning("xFormers not available")
     XFORMERS_AVAILABLE = False
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SDPA_AVAILABLE = hasattr(F, "scaled_dot_product_attention")
+
+
+# Attention kernels take q, k, v as (B, heads, N, head_dim) and return the same layout.
+# The softmax scale is passed explicitly so every backend computes softmax(q k^T * scale) v.
+ATTENTION_BACKENDS: Dict[str, Callable[..., Tensor]] = {}
+
+# "auto" or a key of ATTENTION_BACKENDS; see set_attention_backend
+_attention_backend = "auto"
+
+# "auto" decisions keyed by (B, heads, N, dtype, device), so memory is probed once
+# per input shape rather than in every block, and all blocks of a forward agree.
+_auto_choices: Dict[tuple, str] = {}
+
+# Fraction of the free memory the full N x N attention matrix may use before "auto"
+# switches to the chunked kernel, and the working-set size of one chunked tile.
+ATTENTION_MEMORY_FRACTION = 0.25
+ATTENTION_CHUNK_BYTES = 64 << 20
+
+
+def register_attention_backend(name: str):
+    def decorator(fn):
+        ATTENTION_BACKENDS[name] = fn
+        return fn
+
+    return decorator
+
+
+def set_attention_backend(name: str) -> None:
+    """Select the attention kernel used by all Attention modules: "auto" or a registered name."""
+    global _attention_backend
+    if name != "auto" and name not in ATTENTION_BACKENDS:
+        raise ValueError(f"unknown attention backend {name!r}, expected 'auto' or one of {list(ATTENTION_BACKENDS)}")
+    if name == "sdpa" and not SDPA_AVAILABLE:
+        raise ValueError("the sdpa attention backend needs torch >= 2.0")
+    _attention_backend = name
+    _auto_choices.clear()
+
+
+def get_attention_backend() -> str:
+    return _attention_backend
+
+
+def available_memory(device: torch.device) -> Optional[int]:
+    """Free bytes on device, or None when it cannot be determined."""
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+    if device.type != "cpu":
+        return None
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def select_attention_backend(q: Tensor) -> str:
+    """Pick a backend for q of shape (B, heads, N, head_dim).
+
+    On CUDA, SDPA dispatches to flash / memory-efficient kernels that never
+    materialize the N x N matrix, so it is always used when available. Elsewhere
+    the full attention matrix is estimated against the free memory: small enough
+    and SDPA (or the naive kernel) runs, otherwise the chunked kernel keeps the
+    peak at a few ATTENTION_CHUNK_BYTES tiles. The decision is cached per shape,
+    dtype and device; set_attention_backend clears it.
+    """
+    if _attention_backend != "auto":
+        return _attention_backend
+    if q.device.type == "cuda" and SDPA_AVAILABLE:
+        return "sdpa"
+    B, H, N, _ = q.shape
+    key = (B, H, N, q.dtype, q.device)
+    choice = _auto_choices.get(key)
+    if choice is None:
+        # scores plus the softmax output, in the compute dtype
+        matrix_bytes = 2 * B * H * N * N * q.element_size()
+        free = available_memory(q.device)
+        if free is not None and matrix_bytes > free * ATTENTION_MEMORY_FRACTION:
+            choice = "chunked"
+        else:
+            choice = "sdpa" if SDPA_AVAILABLE else "naive"
+        _auto_choices[key] = choice
+    return choice
+
+
+@register_attention_backend("naive")
+def naive_attention(q: Tensor, k: Tensor, v: Tensor, scale: float, attn_drop: Optional[nn.Module] = None) -> Tensor:
+    attn = (q * scale) @ k.transpose(-2, -1)
+    attn = attn.softmax(dim=-1)
+    if attn_drop is not None:
+        attn = attn_drop(attn)
+    return attn @ v
+
+
+@register_attention_backend("sdpa")
+def sdpa_attention(q: Tensor, k: Tensor, v: Tensor, scale: float, attn_drop: Optional[nn.Module] = None) -> Tensor:
+    dropout_p = attn_drop.p if attn_drop is not None and attn_drop.training else 0.0
+    if scale == q.shape[-1] ** -0.5:
+        return F.scaled_dot_product_attention(q, k, v, dropout_p=dropout_p)
+    # older torch releases have no scale argument; fold it into q instead
+    return F.scaled_dot_product_attention(q * (scale * math.sqrt(q.shape[-1])), k, v, dropout_p=dropout_p)
+
+
+@register_attention_backend("chunked")
+def chunked_attention(
+    q: Tensor, k: Tensor, v: Tensor, scale: float, attn_drop: Optional[nn.Module] = None, chunk_size: Optional[int] = None
+) -> Tensor:
+    """Exact attention over query x key tiles with an online (running max / running sum) softmax.
+
+    Peak memory is a few chunk_size x chunk_size score tiles per head instead of
+    the full N x N matrix. Statistics and accumulators are kept in float32.
+    Attention dropout is not supported (it is 0 in every released checkpoint).
+    """
+    B, H, N, D = q.shape
+    if chunk_size is None:
+        # score tile, its exponent and a temporary of the same size, in float32
+        chunk_size = int(math.sqrt(ATTENTION_CHUNK_BYTES / (3 * 4 * B * H)))
+        chunk_size = max(64, min(N, chunk_size))
+
+    out = torch.empty_like(q)
+    for i in range(0, N, chunk_size):
+        q_chunk = q[:, :, i : i + chunk_size].float() * scale
+        running_max = q_chunk.new_full(q_chunk.shape[:-1] + (1,), float("-inf"))
+        running_sum = q_chunk.new_zeros(q_chunk.shape[:-1] + (1,))
+        acc = q_chunk.new_zeros(q_chunk.shape[:-1] + (v.shape[-1],))
+        for j in range(0, N, chunk_size):
+            scores = q_chunk @ k[:, :, j : j + chunk_size].float().transpose(-2, -1)
+            new_max = torch.maximum(running_max, scores.amax(dim=-1, keepdim=True))
+            scores = torch.exp(scores - new_max)
+            correction = torch.exp(running_max - new_max)
+            running_sum = running_sum * correction + scores.sum(dim=-1, keepdim=True)
+            acc = acc * correction + scores @ v[:, :, j : j + chunk_size].float()
+            running_max = new_max
+        out[:, :, i : i + chunk_size] = (acc / running_sum).to(out.dtype)
+    return out
+
 
 class Attention(nn.Module):
     def __init__(
@@ -50,13 +198,14 @@ class Attention(nn.Module):
         B, N, C = x.shape
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
 
-        q, k, v = qkv[0] * self.scale, qkv[1], qkv[2]
-        attn = q @ k.transpose(-2, -1)
-
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+        q, k, v = qkv[0], qkv[1], qkv[2]
+        if self.training and self.attn_drop.p > 0:
+            backend = "naive"
+        else:
+            backend = select_attention_backend(q)
+        x = ATTENTION_BACKENDS[backend](q, k, v, self.scale, self.attn_drop)
 
-        x = (attn @ v).transpose(1, 2).reshape(B, N, C)
+        x = x.transpose(1, 2).reshape(B, N, C)
         x = self.proj(x)
         x = self.proj_drop(x)
         return x
@@ -64,7 +213,7 @@ class Attention(nn.Module):
 
 class MemEffAttention(Attention):
     def forward(self, x: Tensor, attn_bias=None) -> Tensor:
-        if not XFORMERS_AVAILABLE:
+        if not XFORMERS_AVAILABLE or torch.jit.is_tracing() or torch.onnx.is_in_onnx_export():
             assert attn_bias is None, "xFormers is required for nested tensors usage"
             return super().forward(x)
 
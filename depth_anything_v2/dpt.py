@@ -1,12 +1,13 @@
-import cv2
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torchvision.transforms import Compose
 
 from .dinov2 import DINOv2
 from .util.blocks import FeatureFusionBlock, _make_scratch
-from .util.transform import Resize, NormalizeImage, PrepareForNet
+from .util.precision import PrecisionPolicy
+from .util.preprocess import Preprocessor, get_input_shape
+from .util.tiling import feather_window, fit_affine, tile_grid
 
 
 def _make_fusion_block(features, use_bn, size=None):
@@ -144,13 +145,146 @@ class DPTHead(nn.Module):
         path_1 = self.scratch.refinenet1(path_2, layer_1_rn)
         
         out = self.scratch.output_conv1(path_1)
-        out = F.interpolate(out, (int(patch_h * 14), int(patch_w * 14)), mode="bilinear", align_corners=True)
+        out = F.interpolate(out, (patch_h * 14, patch_w * 14), mode="bilinear", align_corners=True)
         out = self.scratch.output_conv2(out)
         
         return out
 
 
-class DepthAnythingV2(nn.Module):
+class DepthInference(object):
+    """Image-level inference shared by the eager model and exported backends.
+
+    Subclasses provide forward(x), mapping a normalized (B, 3, H, W) input
+    with H and W multiples of 14 to (B, H, W) depth, inference_device(), a
+    precision policy and a _preprocessors dict. backend and quantization
+    describe how the outputs are computed (see depth_model.describe_model).
+    """
+    
+    backend = 'torch'
+    quantization = None
+    
+    @torch.no_grad()
+    def infer_image(self, raw_image, input_size=518, dtype=None, out=None, return_range=False, output_size=None):
+        """Predict the depth of raw_image at its original (h, w), or at output_size=(h, w) if given.
+
+        output_size lets a reduced-resolution decode of a large photo still
+        produce a depth map matching the full-size original.
+
+        With dtype=None the raw float32 depth is returned. With dtype=np.uint8
+        or np.uint16 the min/max reduction, scaling and quantization happen on
+        the device (same mapping as depth_model.normalize_depth), so only the
+        compact map is copied to the host. out can be a preallocated (h, w)
+        array of the matching dtype to copy into. With return_range=True a
+        (depth, (min, max)) tuple is returned, min/max being the raw range.
+        """
+        image, (h, w) = self.image2tensor(raw_image, input_size)
+        if output_size is not None:
+            h, w = output_size
+        
+        with self.precision.autocast():
+            depth = self.forward(image)
+        
+        # upsample in float32: fp16/bf16 lose precision on large outputs
+        depth = F.interpolate(depth[:, None].float(), (h, w), mode="bilinear", align_corners=True)[0, 0]
+        
+        return depth_to_host(depth, dtype, out, return_range)
+    
+    @torch.no_grad()
+    def infer_images(self, raw_images, input_size=518, batch_size=4, dtype=None, return_range=False,
+                     output_sizes=None):
+        """Batched version of infer_image.
+
+        Images whose resized network input has the same shape are stacked into
+        batches of at most batch_size, so no padding is needed. The returned
+        list keeps the order of raw_images and every depth map has the
+        original (h, w) of its image, or the matching entry of output_sizes.
+        dtype and return_range behave as in infer_image.
+        """
+        buckets = {}
+        for i, raw_image in enumerate(raw_images):
+            h, w = raw_image.shape[:2]
+            buckets.setdefault(get_input_shape(h, w, input_size), []).append(i)
+        
+        depths = [None] * len(raw_images)
+        for indices in buckets.values():
+            for start in range(0, len(indices), batch_size):
+                chunk = indices[start:start + batch_size]
+                images = torch.cat([self.image2tensor(raw_images[i], input_size)[0] for i in chunk])
+                
+                with self.precision.autocast():
+                    depth = self.forward(images)
+                
+                for i, d in zip(chunk, depth):
+                    h, w = raw_images[i].shape[:2] if output_sizes is None else output_sizes[i]
+                    d = F.interpolate(d[None, None].float(), (h, w), mode="bilinear", align_corners=True)[0, 0]
+                    depths[i] = depth_to_host(d, dtype, return_range=return_range)
+        
+        return depths
+    
+    @torch.no_grad()
+    def infer_tiled(self, raw_image, input_size=518, overlap=0.25, batch_size=4, dtype=None, out=None,
+                    return_range=False, output_size=None):
+        """High-resolution infer_image: overlapping input_size-pixel tiles, run in batches of
+        batch_size, aligned to a global pass and blended.
+
+        Falls back to infer_image when the short side is at most input_size.
+        Arguments and return value are as in infer_image.
+        """
+        h, w = raw_image.shape[:2]
+        if min(h, w) <= input_size:
+            return self.infer_image(raw_image, input_size, dtype, out, return_range, output_size)
+        preprocessor = self.get_preprocessor(input_size)
+        
+        image, _ = preprocessor(raw_image)
+        with self.precision.autocast():
+            reference = self.forward(image)
+        reference = F.interpolate(reference[:, None].float(), (h, w), mode="bilinear", align_corners=True)[0, 0]
+        
+        crop, corners = tile_grid(h, w, input_size, overlap)
+        window = feather_window(crop, overlap, reference.device)
+        fused = torch.zeros_like(reference)
+        weight = torch.zeros_like(reference)
+        for start in range(0, len(corners), batch_size):
+            chunk = corners[start:start + batch_size]
+            images = torch.cat([preprocessor(raw_image[y:y + crop, x:x + crop])[0] for y, x in chunk])
+            
+            with self.precision.autocast():
+                depth = self.forward(images)
+            
+            depth = F.interpolate(depth[:, None].float(), (crop, crop), mode="bilinear", align_corners=True)[:, 0]
+            scale, shift = fit_affine(depth, torch.stack([reference[y:y + crop, x:x + crop] for y, x in chunk]))
+            depth = depth * scale + shift
+            for (y, x), d in zip(chunk, depth):
+                fused[y:y + crop, x:x + crop].addcmul_(d, window)
+                weight[y:y + crop, x:x + crop] += window
+        
+        depth = fused.div_(weight).clamp_min_(0)
+        if output_size is not None and tuple(output_size) != (h, w):
+            depth = F.interpolate(depth[None, None], tuple(output_size), mode="bilinear", align_corners=True)[0, 0]
+        
+        return depth_to_host(depth, dtype, out, return_range)
+    
+    def image2tensor(self, raw_image, input_size=518):
+        return self.get_preprocessor(input_size)(raw_image)
+    
+    def get_preprocessor(self, input_size=518):
+        """Return the Preprocessor for input_size, matching the model's device and the
+        precision policy's input dtype.
+
+        Preprocessors (and their pinned staging buffers) are kept per model
+        instance and rebuilt only when the model is moved or the policy changes.
+        """
+        device = self.inference_device()
+        key = (input_size, device, self.precision.input_dtype)
+        preprocessor = self._preprocessors.get(key)
+        if preprocessor is None:
+            preprocessor = Preprocessor(input_size, device, self.precision.input_dtype)
+            self._preprocessors = {k: v for k, v in self._preprocessors.items() if k[1:] == key[1:]}
+            self._preprocessors[key] = preprocessor
+        return preprocessor
+
+
+class DepthAnythingV2(nn.Module, DepthInference):
     def __init__(
         self, 
         encoder='vitl', 
@@ -172,6 +306,9 @@ class DepthAnythingV2(nn.Module):
         self.pretrained = DINOv2(model_name=encoder)
         
         self.depth_head = DPTHead(self.pretrained.embed_dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
+        
+        self._preprocessors = {}
+        self.precision = PrecisionPolicy('fp32', 'cpu')
     
     def forward(self, x):
         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
@@ -183,39 +320,53 @@ class DepthAnythingV2(nn.Module):
         
         return depth.squeeze(1)
     
-    @torch.no_grad()
-    def infer_image(self, raw_image, input_size=518):
-        image, (h, w) = self.image2tensor(raw_image, input_size)
-        
-        depth = self.forward(image)
-        
-        depth = F.interpolate(depth[:, None], (h, w), mode="bilinear", align_corners=True)[0, 0]
-        
-        return depth.cpu().numpy().astype('float32')
+    def set_precision(self, policy=None, device=None):
+        """Move/cast the model according to a PrecisionPolicy (or mode name, or None for the
+        device default) and use it for inputs and the forward pass. Returns the active policy."""
+        if device is None:
+            device = next(self.parameters()).device
+        self.precision = PrecisionPolicy.resolve(policy, device)
+        self.to(device=self.precision.device, dtype=self.precision.param_dtype)
+        return self.precision
     
-    def image2tensor(self, raw_image, input_size=518):        
-        transform = Compose([
-            Resize(
-                width=input_size,
-                height=input_size,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
-            NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            PrepareForNet(),
-        ])
-        
-        h, w = raw_image.shape[:2]
-        
-        image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
-        
-        image = transform({'image': image})['image']
-        image = torch.from_numpy(image).unsqueeze(0)
-        
-        DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
-        image = image.to(DEVICE).half()
-        
-        return image, (h, w)
+    def inference_device(self):
+        return next(self.parameters()).device
+
+
+def depth_to_host(depth, dtype=None, out=None, return_range=False):
+    """Copy a (h, w) device depth map to a numpy array, optionally quantizing it on the device first.
+
+    uint8/uint16 maps are min/max normalized to the full integer range and
+    truncated, matching depth_model.normalize_depth. uint16 crosses to the
+    host as an int16 tensor (torch has no general uint16 support) and is
+    reinterpreted with a zero-copy view.
+    """
+    depth = depth.float()
+    depth_min, depth_max = depth.aminmax()
+    if dtype is None:
+        result = depth
+    else:
+        dtype = np.dtype(dtype)
+        if dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"unsupported depth dtype {dtype}")
+        max_value = float(np.iinfo(dtype).max)
+        scale = max_value / (depth_max - depth_min).clamp_min(1e-12)
+        result = ((depth - depth_min) * scale).clamp_(0, max_value)
+        if dtype == np.uint8:
+            result = result.to(torch.uint8)
+        else:
+            # values above 32767 wrap to negative int16, which is the same bit pattern as uint16
+            result = result.to(torch.int32).to(torch.int16)
+    
+    if out is None:
+        host = result.cpu().numpy()
+        if dtype == np.uint16:
+            host = host.view(np.uint16)
+    else:
+        torch.from_numpy(out.view(np.int16) if out.dtype == np.uint16 else out).copy_(result)
+        host = out
+    
+    if return_range:
+        return host, tuple(torch.stack([depth_min, depth_max]).tolist())
+    return host
+
@@ -0,0 +1,72 @@
+import os
+
+import torch
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+from .dpt import DepthInference
+from .util.precision import PrecisionPolicy
+
+
+class OnnxDepthAnything(DepthInference):
+    """DepthAnythingV2 exported to ONNX, run with ONNX Runtime's CPU provider.
+
+    Exposes the same infer_image / infer_images / infer_tiled interface as the
+    eager model. threads sets intra-op parallelism (None lets ONNX Runtime
+    use all physical cores).
+    """
+
+    backend = 'onnx'
+
+    def __init__(self, path, threads=None):
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is required for the ONNX backend: pip install onnxruntime")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.precision = PrecisionPolicy('fp32', 'cpu')
+        self._preprocessors = {}
+
+    def forward(self, x):
+        depth, = self.session.run(None, {self.input_name: x.float().cpu().numpy()})
+        return torch.from_numpy(depth)
+
+    __call__ = forward
+
+    def inference_device(self):
+        return torch.device('cpu')
+
+    def __repr__(self):
+        return f"OnnxDepthAnything({os.path.basename(self.path)}, {self.session.get_providers()[0]})"
+
+
+class TorchScriptDepthAnything(DepthInference):
+    """DepthAnythingV2 exported as a traced TorchScript module (float32)."""
+
+    backend = 'torchscript'
+
+    def __init__(self, path, device="cpu"):
+        self.path = path
+        self.module = torch.jit.load(path, map_location=device).eval()
+        self.precision = PrecisionPolicy('fp32', device)
+        self._preprocessors = {}
+
+    def forward(self, x):
+        return self.module(x)
+
+    __call__ = forward
+
+    def inference_device(self):
+        return self.precision.device
+
+    def __repr__(self):
+        return f"TorchScriptDepthAnything({os.path.basename(self.path)}, {self.precision.device})"
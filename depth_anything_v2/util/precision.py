@@ -0,0 +1,94 @@
+import contextlib
+import functools
+import warnings
+
+import torch
+
+
+@functools.lru_cache(maxsize=None)
+def autocast_supported(device_type):
+    """Whether torch.autocast accepts device_type (e.g. 'mps' only since torch 2.5)."""
+    try:
+        torch.autocast(device_type=device_type, enabled=False)
+    except RuntimeError:
+        return False
+    return True
+
+
+def autocast_enabled(device_type):
+    """Whether an autocast region is active for device_type in the current thread."""
+    try:
+        return torch.is_autocast_enabled(device_type)
+    except TypeError:
+        # torch < 2.4 has no device argument
+        if device_type == 'cuda':
+            return torch.is_autocast_enabled()
+        if device_type == 'cpu':
+            return torch.is_autocast_cpu_enabled()
+        return False
+
+
+def disable_autocast(device_type):
+    """Context manager leaving any active autocast region; a no-op when none is active."""
+    if autocast_supported(device_type) and autocast_enabled(device_type):
+        return torch.autocast(device_type=device_type, enabled=False)
+    return contextlib.nullcontext()
+
+
+class PrecisionPolicy(object):
+    """How a model runs numerically: parameter dtype, input dtype and autocast scope.
+
+    Modes:
+        fp32           everything in float32
+        fp16 / bf16    parameters and inputs cast to half / bfloat16
+        fp16-autocast  float32 parameters and inputs, forward under autocast
+        bf16-autocast  (matmuls/convs in low precision, reductions in float32)
+
+    Position-embedding interpolation and the final depth upsample always run
+    in float32 regardless of the mode.
+    """
+
+    MODES = {
+        # name: (parameter dtype, autocast dtype)
+        'fp32': (torch.float32, None),
+        'fp16': (torch.float16, None),
+        'bf16': (torch.bfloat16, None),
+        'fp16-autocast': (torch.float32, torch.float16),
+        'bf16-autocast': (torch.float32, torch.bfloat16),
+    }
+
+    def __init__(self, mode, device):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown precision mode {mode!r}, expected one of {list(self.MODES)}")
+        self.mode = mode
+        self.device = torch.device(device)
+        self.param_dtype, self.autocast_dtype = self.MODES[mode]
+        # inputs follow the parameters; under autocast the casts happen per op
+        self.input_dtype = self.param_dtype
+        if self.autocast_dtype is not None and not autocast_supported(self.device.type):
+            warnings.warn(f"autocast is not supported on {self.device.type} with torch {torch.__version__}; "
+                          f"{mode} runs in float32")
+
+    @classmethod
+    def auto(cls, device):
+        """Default per device: fp16 on CUDA/MPS, fp32 on CPU (fp16 is slow or unsupported there)."""
+        device = torch.device(device)
+        return cls('fp32' if device.type == 'cpu' else 'fp16', device)
+
+    @classmethod
+    def resolve(cls, policy, device):
+        """Accept a PrecisionPolicy, a mode name or None (auto)."""
+        if isinstance(policy, cls):
+            return policy
+        if policy is None:
+            return cls.auto(device)
+        return cls(policy, device)
+
+    def autocast(self):
+        """Context manager for the forward pass."""
+        if self.autocast_dtype is None or not autocast_supported(self.device.type):
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype)
+
+    def __repr__(self):
+        return f"{self.mode} on {self.device}"
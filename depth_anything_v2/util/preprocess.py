@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .transform import Resize
+
+
+def make_resize(input_size=518, ensure_multiple_of=14):
+    return Resize(
+        width=input_size,
+        height=input_size,
+        resize_target=False,
+        keep_aspect_ratio=True,
+        ensure_multiple_of=ensure_multiple_of,
+        resize_method='lower_bound',
+        image_interpolation_method=cv2.INTER_CUBIC,
+    )
+
+
+def get_input_shape(h, w, input_size=518):
+    """Return the (height, width) an h x w image is resized to before the forward pass."""
+    new_w, new_h = make_resize(input_size).get_size(w, h)
+    return int(new_h), int(new_w)
+
+
+class Preprocessor(object):
+    """Tensor-native replacement for Compose([Resize, NormalizeImage, PrepareForNet]).
+
+    The uint8 image is uploaded once and all the float work (BGR -> RGB,
+    bicubic resize, scaling to [0, 1] plus mean/std normalization, NCHW
+    layout) runs on the target device in float32, then the result is cast to
+    the model dtype. The resize size follows the same lower-bound / multiple
+    of 14 rule as Resize. On CUDA the upload goes through a pinned staging
+    buffer that is reused per image shape.
+    """
+
+    def __init__(
+        self,
+        input_size=518,
+        device="cpu",
+        dtype=torch.float32,
+        mean=(0.485, 0.456, 0.406),
+        std=(0.229, 0.224, 0.225),
+        ensure_multiple_of=14,
+    ):
+        self.input_size = input_size
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self.resize = make_resize(input_size, ensure_multiple_of)
+        # (x / 255 - mean) / std == x * scale + shift
+        std = torch.tensor(std, dtype=torch.float32)
+        mean = torch.tensor(mean, dtype=torch.float32)
+        self.scale = (1.0 / (255.0 * std)).view(1, 3, 1, 1).to(self.device)
+        self.shift = (-mean / std).view(1, 3, 1, 1).to(self.device)
+        self._staging = {}
+
+    def get_input_shape(self, h, w):
+        """Return the (height, width) an h x w image is resized to."""
+        new_w, new_h = self.resize.get_size(w, h)
+        return int(new_h), int(new_w)
+
+    def upload(self, raw_image):
+        """Copy a HxW, HxWx3 (BGR) or HxWx4 (BGRA) array to the device as a uint8 HxWxC tensor.
+
+        16-bit images (e.g. PNGs decoded with IMREAD_UNCHANGED) keep their high
+        byte; float images are taken to be in [0, 1].
+        """
+        if raw_image.dtype == np.uint16:
+            raw_image = (raw_image >> 8).astype(np.uint8)
+        elif raw_image.dtype.kind == 'f':
+            raw_image = (np.clip(raw_image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+        elif raw_image.dtype != np.uint8:
+            raise ValueError(f"unsupported image dtype {raw_image.dtype}")
+        image = torch.from_numpy(np.ascontiguousarray(raw_image))
+        if self.device.type != "cuda":
+            return image.to(self.device)
+
+        staging = self._staging.get(raw_image.shape)
+        if staging is None:
+            staging = self._staging[raw_image.shape] = (
+                torch.empty(raw_image.shape, dtype=torch.uint8).pin_memory(),
+                torch.cuda.Event(),
+            )
+        buffer, copied = staging
+        # the previous asynchronous copy out of this buffer must be finished before reusing it
+        copied.synchronize()
+        buffer.copy_(image)
+        image = buffer.to(self.device, non_blocking=True)
+        copied.record()
+        return image
+
+    def __call__(self, raw_image):
+        """Return the (1, 3, H, W) network input on the device and the original (h, w)."""
+        h, w = raw_image.shape[:2]
+        new_h, new_w = self.get_input_shape(h, w)
+
+        image = self.upload(raw_image)
+        if image.ndim == 2:
+            image = image[:, :, None].expand(h, w, 3)
+        else:
+            image = image[:, :, [2, 1, 0]] # BGR(A) -> RGB
+        image = image.permute(2, 0, 1)[None].float()
+
+        if (new_h, new_w) != (h, w):
+            # same kernel (a = -0.75) and half-pixel mapping as cv2.INTER_CUBIC
+            image = F.interpolate(image, (new_h, new_w), mode="bicubic", align_corners=False)
+
+        image = torch.addcmul(self.shift, image, self.scale)
+        return image.to(self.dtype).contiguous(), (h, w)
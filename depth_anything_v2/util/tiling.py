@@ -0,0 +1,53 @@
+import math
+
+import torch
+
+
+def axis_positions(length, crop, stride):
+    """Start offsets of crop-sized windows covering [0, length) with at most the given stride.
+
+    The windows are spread evenly so the first starts at 0 and the last ends
+    exactly at length.
+    """
+    if length <= crop:
+        return [0]
+    count = int(math.ceil((length - crop) / stride)) + 1
+    return [round(i * (length - crop) / (count - 1)) for i in range(count)]
+
+
+def tile_grid(h, w, tile_size=518, overlap=0.25):
+    """Return the square tile side and the (y, x) corners of overlapping tiles covering an h x w image.
+
+    Tiles are tile_size source pixels wide (capped at the short side), so
+    each one runs through the network at about its native resolution and the
+    tile count follows the image size. Neighbouring tiles share at least
+    overlap of the tile side.
+    """
+    crop = min(h, w, int(tile_size))
+    stride = max(1.0, crop * (1 - overlap))
+    return crop, [(y, x) for y in axis_positions(h, crop, stride) for x in axis_positions(w, crop, stride)]
+
+
+def feather_window(size, overlap=0.25, device="cpu"):
+    """(size, size) blending weights ramping linearly from ~0 at the border to 1 over the overlap band."""
+    ramp = max(1.0, size * overlap)
+    r = ((torch.arange(size, device=device, dtype=torch.float32) + 0.5) / ramp).clamp_(max=1.0)
+    r = torch.minimum(r, r.flip(0))
+    return r[:, None] * r[None, :]
+
+
+def fit_affine(source, target):
+    """Least-squares scale and shift mapping each (H, W) map in source onto target.
+
+    source and target are (B, H, W); returns (B, 1, 1) scale and shift. The
+    scale is clamped at 0 so a tile that disagrees with the reference is
+    flattened rather than inverted.
+    """
+    source_mean = source.mean(dim=(1, 2), keepdim=True)
+    target_mean = target.mean(dim=(1, 2), keepdim=True)
+    centered = source - source_mean
+    variance = (centered * centered).mean(dim=(1, 2), keepdim=True)
+    covariance = (centered * (target - target_mean)).mean(dim=(1, 2), keepdim=True)
+    scale = (covariance / variance.clamp_min(1e-12)).clamp_min_(0)
+    shift = target_mean - scale * source_mean
+    return scale, shift
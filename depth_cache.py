@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from depth_model import convert_depth
+
+
+def file_digest(path, memo_path=None):
+    """
+    计算文件内容的哈希，用于标识权重文件。
+
+    权重文件很大，结果按 (路径, 大小, 修改时间) 记录在 memo_path 中，未变化时直接复用。
+    """
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    memo = {}
+    if memo_path is not None and os.path.exists(memo_path):
+        with open(memo_path, 'r', encoding='utf-8') as f:
+            memo = json.load(f)
+        if memo_key in memo:
+            return memo[memo_key]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    if memo_path is not None:
+        memo[memo_key] = digest
+        with open(memo_path, 'w', encoding='utf-8') as f:
+            json.dump(memo, f, indent=2)
+    return digest
+
+
+class DepthCache:
+    """
+    以内容寻址的磁盘深度缓存，带容量上限的 LRU 淘汰。
+
+    键由解码后的图像像素哈希、编码器名称、权重文件哈希、推理尺寸以及预处理选项
+    （增强、9:16 等）共同决定；值为深度及其原始范围 (min, max)，保存为 .npz。
+    dtype 为 uint16（默认）时保存归一化后的 16 位深度，可直接存入推理端量化好的结果；
+    为 float16/float32 时保存原始深度。需要原始深度的调用方（如输出 npy）可在 make_key/put
+    中单独指定 dtype，存储类型计入键，不会与量化后的条目混用。修改交织参数后重新渲染、或增量同步目录时，
+    已见过的图像无需再推理。可在多个线程中同时使用。
+    """
+
+    def __init__(self, directory="cache/depth", max_bytes=4 * 1024 ** 3, dtype='uint16'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # 按最近访问时间 (mtime) 恢复 LRU 顺序
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.npz'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def weights_digest(self, weights_path):
+        return file_digest(weights_path, os.path.join(self.directory, 'weights.json'))
+
+    def make_key(self, image, encoder, weights_digest, input_size, flags=None, dtype=None):
+        """dtype 为该条目的存储类型（默认为缓存的 dtype），put 时需传入相同的 dtype。"""
+        dtype = np.dtype(dtype or self.dtype)
+        image = np.ascontiguousarray(image)
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{image.shape}|{image.dtype}".encode())
+        h.update(image.data)
+        description = [h.hexdigest(), encoder, weights_digest, int(input_size), dtype.str]
+        description += [f"{k}={v}" for k, v in sorted((flags or {}).items())]
+        return hashlib.blake2b('|'.join(map(str, description)).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """
+        返回 (depth, depth_range)，未命中返回 None。
+
+        depth 为 uint16 归一化深度或 float32 原始深度（取决于 dtype），depth_range 为原始范围 (min, max)。
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                depth = data['depth']
+                depth_range = tuple(float(v) for v in data['range'])
+            if depth.dtype.kind == 'f':
+                depth = depth.astype(np.float32)
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+        return depth, depth_range
+
+    def put(self, key, depth, depth_range=None, dtype=None):
+        """
+        保存深度。depth 可以是原始浮点深度，也可以是归一化后的 uint8/uint16 深度
+        （此时需要同时给出原始范围 depth_range）。dtype 与 make_key 时一致。
+        """
+        dtype = np.dtype(dtype or self.dtype)
+        depth = np.asarray(depth)
+        if depth.dtype.kind == 'f':
+            depth_range = (float(depth.min()), float(depth.max()))
+        elif depth_range is None:
+            raise ValueError("归一化深度需要提供原始范围 depth_range")
+        if dtype.kind == 'f':
+            depth = convert_depth(depth, dtype, depth_range)
+        else:
+            depth = convert_depth(depth, dtype)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, depth=depth, range=np.array(depth_range, dtype=np.float64))
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        evicted = []
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
@@ -0,0 +1,140 @@
+import os
+
+import cv2
+import numpy as np
+import torch
+from safetensors.torch import load_file
+
+from depth_anything_v2.dpt import DepthAnythingV2
+from depth_anything_v2.runtime import OnnxDepthAnything, TorchScriptDepthAnything
+
+# 配置模型
+model_configs = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
+    'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
+}
+
+
+def get_device():
+    return 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
+
+
+# int8 动态量化的线性层：DINOv2 各 block 中注意力的 qkv/proj 与 MLP 的 fc1/fc2（vitg 的 SwiGLU 为 w12/w3）
+QUANTIZED_LINEAR_SUFFIXES = ('attn.qkv', 'attn.proj', 'mlp.fc1', 'mlp.fc2', 'mlp.w12', 'mlp.w3')
+
+
+def quantize_int8(model):
+    """
+    对编码器 block 中的线性层做 int8 动态量化（权重 int8，激活按批动态量化），原地修改并返回模型。
+    DPT 头及其余层保持 fp32。只能在 CPU 上运行。
+    """
+    names = {
+        name for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and name.startswith('pretrained.blocks.')
+        and name.endswith(QUANTIZED_LINEAR_SUFFIXES)
+    }
+    return torch.ao.quantization.quantize_dynamic(model, names, dtype=torch.qint8, inplace=True)
+
+
+# 推理后端 -> 模型文件扩展名，backend 为 None 时按 depth_path 的扩展名选择
+BACKEND_EXTENSIONS = {
+    'onnx': ('.onnx',),
+    'torchscript': ('.pt', '.ts'),
+}
+
+
+def detect_backend(depth_path):
+    """根据模型文件扩展名推断推理后端：.onnx 为 onnx，.pt/.ts 为 torchscript，其余为 torch（即时模式）。"""
+    extension = os.path.splitext(depth_path)[1].lower()
+    for backend, extensions in BACKEND_EXTENSIONS.items():
+        if extension in extensions:
+            return backend
+    return 'torch'
+
+
+def load_model(encoder, depth_path, device=None, precision=None, backend=None, threads=None):
+    """
+    加载 Depth Anything V2 模型并移动到推理设备。
+
+    backend: "torch"（.safetensors 权重，PyTorch 即时模式）、"onnx"（ONNX Runtime CPU）
+    或 "torchscript"（export_model.py 导出的模型）；None 时按 depth_path 的扩展名选择。
+    三种后端提供相同的 infer_image / infer_images / infer_tiled 接口。
+    threads: onnx 后端的线程数（None 为 ONNX Runtime 默认值）。
+
+    precision（仅 torch 后端）: PrecisionPolicy 的模式名（"fp32"、"fp16"、"bf16"、"fp16-autocast"、"bf16-autocast"）
+    或 "int8"（CPU 动态量化，见 quantize_int8）；None 时按设备自动选择：GPU 上 fp16，CPU 上 fp32。
+    导出的模型固定为 fp32。
+    """
+    backend = backend or detect_backend(depth_path)
+    if backend == 'onnx':
+        model = OnnxDepthAnything(depth_path, threads)
+        print(f"推理后端: {model}")
+        return model
+    device = device or get_device()
+    if backend == 'torchscript':
+        model = TorchScriptDepthAnything(depth_path, device)
+        print(f"推理后端: {model}")
+        return model
+    if backend != 'torch':
+        raise ValueError(f"未知的推理后端: {backend}")
+    model = DepthAnythingV2(**model_configs[encoder])
+    model.load_state_dict(load_file(depth_path))
+    model.eval()
+    if precision == 'int8':
+        if device != 'cpu':
+            print(f"int8 动态量化只支持 CPU，忽略设备 {device}")
+        model.set_precision('fp32', 'cpu')
+        model = quantize_int8(model)
+        model.quantization = 'int8'
+        print(f"推理精度: {describe_model(model)}")
+        return model
+    try:
+        policy = model.set_precision(precision, device)
+    except ValueError:
+        raise ValueError(f"未知的推理精度: {precision}")
+    print(f"推理精度: {policy}")
+    return model
+
+
+def describe_model(model):
+    """返回模型的推理方式（后端、精度、量化、设备），如 "torch fp16 on cuda:0"，用于缓存键和日志。"""
+    description = f"{model.backend} {model.precision}"
+    if model.quantization is not None:
+        description += f" {model.quantization}"
+    return description
+
+
+def normalize_depth(depth, dtype=np.uint8):
+    """将原始深度按最小/最大值归一化：uint8 为 0-255，uint16 为 0-65535，float32 为 0-1。"""
+    dtype = np.dtype(dtype)
+    max_value = 1.0 if dtype.kind == 'f' else np.iinfo(dtype).max
+    depth_normalized = cv2.normalize(depth, None, 0, max_value, cv2.NORM_MINMAX)
+    return depth_normalized.astype(dtype)
+
+
+def convert_depth(depth, dtype, depth_range=None):
+    """
+    在深度表示之间转换：原始浮点深度，或按最小/最大值归一化的 uint8 / uint16 深度。
+
+    目标为整数类型时：浮点深度用 normalize_depth 归一化，整数深度直接换算位宽。
+    目标为 float32 时：浮点深度原样返回；整数深度按 depth_range (min, max) 还原为原始深度，
+    depth_range 为 None 时还原为 0-1。
+    """
+    dtype = np.dtype(dtype)
+    if depth.dtype == dtype:
+        return depth
+    if dtype.kind == 'f':
+        if depth.dtype.kind == 'f':
+            return depth.astype(dtype)
+        depth_min, depth_max = depth_range if depth_range is not None else (0.0, 1.0)
+        scale = (depth_max - depth_min) / np.iinfo(depth.dtype).max
+        return (depth.astype(dtype) * dtype.type(scale) + dtype.type(depth_min)).astype(dtype, copy=False)
+    if depth.dtype.kind == 'f':
+        return normalize_depth(depth, dtype)
+    shift = 8 * (depth.dtype.itemsize - dtype.itemsize)
+    if shift > 0:
+        return (depth >> shift).astype(dtype)
+    # 8 位 -> 16 位：乘以 257 使 255 映射到 65535
+    return depth.astype(dtype) * dtype.type((np.iinfo(dtype).max) // np.iinfo(depth.dtype).max)
@@ -1,10 +1,17 @@
-import moderngl
+try:
+    import moderngl
+except ImportError:
+    moderngl = None
 import numpy as np
 from PIL import Image
 import argparse
-import sys
 import os
+import hashlib
+import queue
+import threading
+from concurrent.futures import Future
 import yaml
+from image_io import load_depth_npy, write_image
 
 def load_shader_code(path):
     with open(path, 'r', encoding='utf-8') as f:
@@ -16,161 +23,684 @@ def hex_to_rgb(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
 
+def load_color_array(source):
+    """将彩色图（文件路径或 RGB/RGBA/灰度 ndarray）转换为 RGBA uint8 数组。"""
+    if isinstance(source, np.ndarray):
+        image = source
+        if image.dtype != np.uint8:
+            raise ValueError(f"彩色图必须为 uint8，实际为 {image.dtype}")
+        if image.ndim == 2:
+            image = np.repeat(image[:, :, None], 3, axis=2)
+        if image.shape[2] == 3:
+            alpha = np.full(image.shape[:2] + (1,), 255, dtype=np.uint8)
+            image = np.concatenate([image, alpha], axis=2)
+        return np.ascontiguousarray(image)
+    return np.asarray(Image.open(source).convert('RGBA'))
+
+
+def load_depth_array(source):
+    """
+    将深度图（文件路径或 ndarray）转换为单通道数组，保留原始精度：
+    uint8 / uint16 原样返回（包括 16 位 PNG），浮点数转换为 float32（取值 0-1）。
+    原始 float32 深度 (.npy) 以内存映射读取，并按旁路文件 <name>.range.json 中的范围归一化。
+    多通道图像只取第一个通道，与着色器读取 .r 一致。
+    """
+    if isinstance(source, np.ndarray):
+        depth = source
+    elif os.path.splitext(source)[1].lower() == '.npy':
+        depth = load_depth_npy(source)
+    else:
+        image = Image.open(source)
+        if image.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+            depth = np.clip(np.asarray(image), 0, 65535).astype(np.uint16)
+        elif image.mode in ('L', 'F'):
+            depth = np.asarray(image)
+        else:
+            depth = np.asarray(image.convert('RGB'))
+    if depth.ndim == 3:
+        depth = depth[:, :, 0]
+    if depth.dtype.kind == 'f':
+        depth = depth.astype(np.float32)
+    elif depth.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"不支持的深度图类型 {depth.dtype}")
+    return np.ascontiguousarray(depth)
+
+
+# 深度数组类型 -> ModernGL 单通道纹理格式 (R8 / R16 / R32F)
+DEPTH_TEXTURE_DTYPES = {
+    np.dtype(np.uint8): 'f1',
+    np.dtype(np.uint16): 'nu2',
+    np.dtype(np.float32): 'f4',
+}
+
+
+# 光栅参数 -> 子像素视图索引查找表
+QUILT_SIZE = (8, 5) # 与片元着色器中的 quiltSize 一致
+NUM_VIEWS = QUILT_SIZE[0] * QUILT_SIZE[1]
+INV_VIEW = 0.0
+VIEW_LUT_VERSION = 1
+
+
+def compute_view_lut(width, height, line_number, obliquity, deviation):
+    """
+    计算每个输出子像素 (R/G/B) 对应的视图索引，返回 (height, width, 3) uint8 数组，行序从上到下。
+
+    视图索引只取决于线数、倾斜度、偏差和屏幕尺寸，与输入图像无关。
+    计算方式与原片元着色器 main() 中的 pitch/slope/center 公式一致（float32 运算），
+    其中屏幕尺寸取输出尺寸，不再固定为 1440x2560。
+    """
+    f = np.float32
+    screen_width, screen_height = f(width), f(height)
+    pitch = (screen_width * f(3.0)) / f(line_number)
+    slope = f(obliquity) * (screen_height / screen_width)
+    subp = f(1.0) / (screen_width * f(3.0))
+    center = (f(deviation) * f(3.0) / screen_width) * pitch
+
+    # 像素中心的纹理坐标，v 从图像顶部开始
+    u = ((np.arange(width, dtype=f) + f(0.5)) / screen_width)[None, :]
+    v = ((np.arange(height, dtype=f) + f(0.5)) / screen_height)[:, None]
+    lut = np.empty((height, width, 3), dtype=np.uint8)
+    for channel in range(3):
+        z = (u + f(channel) * subp + v * slope) * pitch - center
+        z = z + np.ceil(np.abs(z))
+        z = z - np.floor(z) # mod(z, 1.0)
+        z = (f(1.0) - f(INV_VIEW)) * z + f(INV_VIEW) * (f(1.0) - z)
+        lut[:, :, channel] = np.floor((f(1.0) - z) * f(NUM_VIEWS))
+    return lut
+
+
+def load_view_lut(width, height, line_number, obliquity, deviation, cache_dir="cache/view_lut"):
+    """读取或计算视图索引查找表，并按显示参数缓存到磁盘 (.npy)。cache_dir 为 None 时不缓存。"""
+    if cache_dir is None:
+        return compute_view_lut(width, height, line_number, obliquity, deviation)
+    key = f"{VIEW_LUT_VERSION}|{width}|{height}|{float(line_number)!r}|{float(obliquity)!r}|{float(deviation)!r}"
+    path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".npy")
+    if os.path.exists(path):
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            pass
+    lut = compute_view_lut(width, height, line_number, obliquity, deviation)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, lut)
+    os.replace(tmp_path, path)
+    return lut
+
+
+# 3x3 卷积核，与原片元着色器中的 gaussian_blur / box_blur 宏一致
+GAUSSIAN_KERNEL = tuple(v * 0.0625 for v in (1, 2, 1, 2, 4, 2, 1, 2, 1))
+BOX_KERNEL = tuple(v * 0.1111 for v in (1, 1, 1, 1, 1, 1, 1, 1, 1))
+
+
+def _create_texture(ctx, size, components, dtype):
+    texture = ctx.texture(size, components, dtype=dtype)
+    if dtype[0] in 'ui':
+        texture.filter = (moderngl.NEAREST, moderngl.NEAREST) # 整数纹理只能用最近邻
+    else:
+        texture.filter = (moderngl.LINEAR, moderngl.LINEAR) # 线性过滤
+    texture.repeat_x = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
+    texture.repeat_y = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
+    return texture
+
+
+class RenderPass:
+    """
+    渲染图中的一个 pass：用 program 绘制全屏四边形，把 inputs 中的纹理资源渲染到 output 资源。
+
+    inputs 为 {采样器 uniform 名: 资源名}，uniforms 为 {uniform 名: 值}。
+    """
+
+    def __init__(self, name, program, vao, output):
+        self.name = name
+        self.program = program
+        self.vao = vao
+        self.output = output
+        self.inputs = {}
+        self.uniforms = {}
+        self.enabled = True
+        self._written = {}
+        self._state = None
+
+    def execute(self, graph):
+        for unit, (sampler, resource) in enumerate(sorted(self.inputs.items())):
+            graph.textures[resource].use(unit)
+            self._write_uniform(sampler, unit)
+        for name, value in self.uniforms.items():
+            self._write_uniform(name, value)
+        fbo = graph.framebuffers[self.output]
+        fbo.use()
+        graph.ctx.viewport = (0, 0, fbo.width, fbo.height) # 设置视口
+        self.vao.render(moderngl.TRIANGLE_STRIP) # 使用三角形带模式渲染全屏四边形
+
+    def _write_uniform(self, name, value):
+        # uniform 只在值变化时更新
+        if self._written.get(name) != value:
+            self.program[name].value = value
+            self._written[name] = value
+
+
+class RenderGraph:
+    """
+    按添加顺序执行的简单 pass 图。
+
+    每个纹理资源带一个版本号：外部上传或被某个 pass 重新渲染时递增。
+    某个 pass 的输入版本、uniform 和输出尺寸都与上次执行时相同时跳过该 pass，
+    因此模糊 pass 每个输入只执行一次，参数不变时重复渲染也不会重复模糊。
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.passes = []
+        self.textures = {}
+        self.framebuffers = {}
+        self.versions = {}
+
+    def add_pass(self, render_pass):
+        self.passes.append(render_pass)
+        return render_pass
+
+    def upload(self, name, image, dtype=None):
+        """
+        上传数组为输入资源；尺寸和格式不变时复用已有纹理。
+        (H, W, 4) uint8 上传为 RGBA8，(H, W) 深度按类型上传为单通道 R8/R16/R32F；
+        也可以用 dtype 指定 ModernGL 纹理格式（如整数纹理 'u1'）。
+        """
+        size = (image.shape[1], image.shape[0])
+        components = 1 if image.ndim == 2 else image.shape[2]
+        if dtype is None:
+            dtype = DEPTH_TEXTURE_DTYPES[image.dtype] if components == 1 else 'f1'
+        texture = self._ensure_texture(name, size, components, dtype)
+        texture.write(np.ascontiguousarray(image))
+        self.versions[name] = self.versions.get(name, 0) + 1
+        return texture
+
+    def target(self, name, size, components=4, dtype='f1'):
+        """声明一个可渲染的中间/输出资源；尺寸或格式变化时重新分配纹理和 FBO。"""
+        texture = self.textures.get(name)
+        self._ensure_texture(name, size, components, dtype)
+        if self.textures[name] is not texture or name not in self.framebuffers:
+            if name in self.framebuffers:
+                self.framebuffers[name].release()
+            # 创建一个帧缓冲区对象并将渲染纹理附加到它
+            self.framebuffers[name] = self.ctx.framebuffer(self.textures[name])
+        return self.framebuffers[name]
+
+    def _ensure_texture(self, name, size, components, dtype):
+        texture = self.textures.get(name)
+        if texture is None or (texture.size, texture.components, texture.dtype) != (size, components, dtype):
+            if texture is not None:
+                texture.release()
+            texture = self.textures[name] = _create_texture(self.ctx, size, components, dtype)
+            self.versions[name] = self.versions.get(name, 0) + 1
+        return texture
+
+    def execute(self):
+        for render_pass in self.passes:
+            if not render_pass.enabled:
+                continue
+            state = (
+                tuple((sampler, resource, self.versions[resource])
+                      for sampler, resource in sorted(render_pass.inputs.items())),
+                tuple(sorted(render_pass.uniforms.items())),
+                self.versions[render_pass.output],
+            )
+            if state == render_pass._state:
+                continue
+            render_pass.execute(self)
+            self.versions[render_pass.output] += 1
+            render_pass._state = state[:2] + (self.versions[render_pass.output],)
+
+    def release(self):
+        for fbo in self.framebuffers.values():
+            fbo.release()
+        for texture in self.textures.values():
+            texture.release()
+        self.framebuffers.clear()
+        self.textures.clear()
+
+
 # --- 3. 主渲染逻辑 ---
+class HologramRenderer:
+    """
+    可复用的交织渲染器。
+
+    ModernGL 上下文、编译后的着色器程序、全屏四边形几何体和输出 FBO 在多次调用之间保持不变；
+    每次渲染只上传新的纹理数据（输入尺寸变化时才重新分配纹理），uniform 也只在值变化时更新。
+    渲染由一个小型 pass 图驱动：
+      depth_blur: 深度图 box 模糊 -> R32F 中间纹理（每个输入只做一次）
+      color_blur: 原始图像高斯模糊 -> RGBA8 中间纹理（每个输入只做一次）
+      interlace:  交织 pass，只对预先模糊好的纹理做查表；每个子像素的视图索引来自
+                  按显示参数预先计算（并缓存到磁盘）的查找表纹理
+    ModernGL 上下文与创建它的线程绑定，只能在一个线程中使用；多线程程序请通过 get_renderer 使用常驻渲染线程中的共享实例。
+    """
+
+    def __init__(self,
+                 vertex_shader_path="shaders/vertex_shader.glsl",
+                 fragment_shader_path="shaders/depth_fragment_shader.glsl",
+                 blur_shader_path="shaders/blur_fragment_shader.glsl",
+                 lut_cache_dir="cache/view_lut"):
+        self.lut_cache_dir = lut_cache_dir
+        self._view_lut_key = None
+        # 创建ModernGL上下文 (离屏渲染)
+        if moderngl is None:
+            raise RuntimeError("未安装 moderngl")
+        self.ctx = moderngl.create_context(standalone=True)
+        print("OpenGL context created.")
+
+        # --- 加载着色器 ---
+        vertex_shader_source = load_shader_code(vertex_shader_path)
+        self.program = self.ctx.program(
+            vertex_shader=vertex_shader_source,
+            fragment_shader=load_shader_code(fragment_shader_path),
+        )
+        blur_shader_source = load_shader_code(blur_shader_path)
+        self.blur_programs = [
+            self.ctx.program(vertex_shader=vertex_shader_source, fragment_shader=blur_shader_source)
+            for _ in range(2)
+        ]
+
+        # --- 设置几何体 (全屏四边形) ---
+        # 顶点数据: x, y, z, u, v
+        # 垂直翻转放在纹理坐标里：v=0（图像第一行）落在 FBO 第 0 行，即 glReadPixels 最先读出的一行，
+        # 因此读回的数据已经是从上到下的行顺序，不需要在 CPU 上再翻转；各个 pass 共用同一个四边形。
+        vertices = np.array([
+            -1.0, -1.0, 0.0, 0.0, 0.0,  # FBO 第 0 行 -> 图像顶部
+             1.0, -1.0, 0.0, 1.0, 0.0,
+            -1.0,  1.0, 0.0, 0.0, 1.0,  # FBO 最后一行 -> 图像底部
+             1.0,  1.0, 0.0, 1.0, 1.0
+        ], dtype='f4') # 'f4' 表示 float32
+        self.vbo = self.ctx.buffer(vertices)
+        # 定义顶点缓冲区数据如何映射到着色器属性
+        self.vao = self.ctx.vertex_array(self.program, [(self.vbo, '3f 2f', 'a_Position', 'a_TexCoord')])
+        self.blur_vaos = [
+            self.ctx.vertex_array(program, [(self.vbo, '3f 2f', 'a_Position', 'a_TexCoord')])
+            for program in self.blur_programs
+        ]
+
+        # 帧序列模式：两个像素缓冲区 (PBO) 轮流接收异步读回
+        self._pbos = [None, None]
+        self._pending = None
+        self._frame_index = 0
+
+        # --- 构建 pass 图 ---
+        self.graph = RenderGraph(self.ctx)
+        self.depth_blur = self.graph.add_pass(RenderPass('depth_blur', self.blur_programs[0], self.blur_vaos[0], 'depth_blur'))
+        self.depth_blur.inputs['u_Source'] = 'depth'
+        self.depth_blur.uniforms['u_Kernel'] = BOX_KERNEL
+        self.color_blur = self.graph.add_pass(RenderPass('color_blur', self.blur_programs[1], self.blur_vaos[1], 'color_blur'))
+        self.color_blur.inputs['u_Source'] = 'color'
+        self.color_blur.uniforms['u_Kernel'] = GAUSSIAN_KERNEL
+        self.interlace = self.graph.add_pass(RenderPass('interlace', self.program, self.vao, 'output'))
+
+    def render(
+        self,
+        image_file="input.jpg",
+        depth_file="depth.png",
+        output_file=None,
+        output_width=1440,
+        output_height=2560,
+        threshold=15.0,
+        protrude=0,
+        line_number=19.61603,
+        obliquity=0.101593,
+        deviation=15.83299625,
+        scale_x=1.0,
+        scale_y=1.0,
+        offset_x=0.0,
+        offset_y=0.0,
+        blur_size=5.0,
+        blur_depth=0.25,
+        depth_image_blur_size=50.0,
+        border_color="#FFFFFF",
+        border_size_x=0.02,
+        border_size_y=0.01,
+    ):
+        """
+        渲染交织图并返回 (output_height, output_width, 4) 的 RGBA uint8 数组。
+
+        image_file / depth_file 可以是文件路径，也可以是内存中的数组
+        （RGB 彩色图；uint8/uint16/float32 深度图，深度以单通道纹理上传，不降到 8 位）。
+        output_file 不为 None 时同时保存为 PNG。加载图像失败时返回 None。
+        """
+        fbo = self._draw(
+            image_file, depth_file, output_width, output_height,
+            threshold, protrude, line_number, obliquity, deviation,
+            scale_x, scale_y, offset_x, offset_y,
+            blur_size, blur_depth, depth_image_blur_size,
+            border_color, border_size_x, border_size_y,
+        )
+        if fbo is None:
+            return None
+
+        # --- 读取像素并保存图像 ---
+        image_data = fbo.read(components=4, dtype='f1') # 'f1' 表示8位无符号整数 (字节)
+        output_image = np.frombuffer(image_data, dtype=np.uint8).reshape(output_height, output_width, 4)
+
+        if output_file is not None:
+            write_image(output_file, output_image) # 格式按扩展名推断 (png/webp/bmp/ppm/npy)
+            print(f"Rendered image saved to {output_file}")
+        return output_image
+
+    def begin_sequence(self):
+        """开始一个帧序列（如交织视频），丢弃上一个序列未取走的帧。"""
+        self._pending = None
+        self._frame_index = 0
+
+    def push_frame(self, image_file, depth_file, output_width=1440, output_height=2560, **params):
+        """
+        渲染一帧并把像素异步读回到 PBO，然后取回上一帧的结果。
+
+        两个 PBO 轮流使用：第 N 帧的 glReadPixels 写入一个 PBO 后立即返回，
+        取第 N-1 帧时只等待另一个 PBO，GPU 可以在 CPU 处理上一帧的同时绘制并下载当前帧。
+        返回上一帧的 (H, W, 4) RGBA 数组，序列的第一帧返回 None；最后一帧由 end_sequence 取回。
+        调用方只需把非 None 的返回值当作按顺序完成的下一帧（CPU 渲染器没有延迟，直接返回当前帧）。
+        参数同 render（不含 output_file）；加载图像失败时抛出 ValueError。
+        """
+        fbo = self._draw(image_file, depth_file, output_width, output_height, **params)
+        if fbo is None:
+            raise ValueError("加载帧图像失败")
+        slot = self._frame_index % 2
+        nbytes = output_width * output_height * 4
+        pbo = self._pbos[slot]
+        if pbo is None or pbo.size != nbytes:
+            if pbo is not None:
+                pbo.release()
+            pbo = self._pbos[slot] = self.ctx.buffer(reserve=nbytes)
+        fbo.read_into(pbo, components=4, dtype='f1') # 读入 PBO，不等待 GPU 完成
+        previous = self._collect()
+        self._pending = (slot, output_height, output_width)
+        self._frame_index += 1
+        return previous
+
+    def end_sequence(self):
+        """结束帧序列，返回最后一帧（没有待取回的帧时返回 None）。"""
+        last = self._collect()
+        self._frame_index = 0
+        return last
+
+    def render_sequence(self, frames, **params):
+        """
+        依次渲染 frames 中的 (image, depth)，按顺序逐帧产出 RGBA 数组。
+
+        内部使用 push_frame 的双缓冲异步读回，产出比提交滞后一帧。参数同 render（不含 output_file）。
+        """
+        self.begin_sequence()
+        for image, depth in frames:
+            output_image = self.push_frame(image, depth, **params)
+            if output_image is not None:
+                yield output_image
+        output_image = self.end_sequence()
+        if output_image is not None:
+            yield output_image
+
+    def _collect(self):
+        if self._pending is None:
+            return None
+        slot, height, width = self._pending
+        self._pending = None
+        return np.frombuffer(self._pbos[slot].read(), dtype=np.uint8).reshape(height, width, 4)
+
+    def _draw(
+        self,
+        image_file,
+        depth_file,
+        output_width=1440,
+        output_height=2560,
+        threshold=15.0,
+        protrude=0,
+        line_number=19.61603,
+        obliquity=0.101593,
+        deviation=15.83299625,
+        scale_x=1.0,
+        scale_y=1.0,
+        offset_x=0.0,
+        offset_y=0.0,
+        blur_size=5.0,
+        blur_depth=0.25,
+        depth_image_blur_size=50.0,
+        border_color="#FFFFFF",
+        border_size_x=0.02,
+        border_size_y=0.01,
+    ):
+        """上传输入并执行 pass 图，返回输出 FBO；加载图像失败时返回 None。"""
+        # --- 加载图像 ---
+        try:
+            img_orig = load_color_array(image_file)
+            img_depth = load_depth_array(depth_file)
+            if not isinstance(image_file, np.ndarray):
+                print(f"Loaded quilt image: {image_file} ({img_orig.shape[1]}x{img_orig.shape[0]})")
+            if not isinstance(depth_file, np.ndarray):
+                print(f"Loaded depth image: {depth_file} ({img_depth.shape[1]}x{img_depth.shape[0]})")
+        except FileNotFoundError as e:
+            print(f"错误: {e}. 请检查图像文件路径。")
+            return None
+        except Exception as e:
+            print(f"加载图像时出错: {e}")
+            return None
+
+        graph = self.graph
+        screen = (float(output_width), float(output_height))
+        # 输入纹理：color (原始图像, quilt) / depth (深度图)
+        graph.upload('color', img_orig)
+        graph.upload('depth', img_depth)
+
+        # 模糊 pass：卷积偏移量以输出屏幕像素为单位 (size / g_Screen.xy)，尺寸小于 1 时不模糊
+        self.depth_blur.enabled = depth_image_blur_size >= 1.0
+        if self.depth_blur.enabled:
+            graph.target('depth_blur', (img_depth.shape[1], img_depth.shape[0]), 1, 'f4')
+            self.depth_blur.uniforms['u_Step'] = (depth_image_blur_size / screen[0], depth_image_blur_size / screen[1])
+        self.color_blur.enabled = blur_size >= 1.0
+        if self.color_blur.enabled:
+            graph.target('color_blur', (img_orig.shape[1], img_orig.shape[0]), 4, 'f1')
+            self.color_blur.uniforms['u_Step'] = (blur_size / screen[0], blur_size / screen[1])
+
+        # 视图索引查找表只在输出尺寸或光栅参数变化时重新上传
+        view_lut_key = (output_width, output_height, line_number, obliquity, deviation)
+        if view_lut_key != self._view_lut_key:
+            view_lut = load_view_lut(*view_lut_key, cache_dir=self.lut_cache_dir)
+            # FBO 第 0 行即图像顶部，查找表按原行序上传
+            graph.upload('view_lut', view_lut, dtype='u1')
+            self._view_lut_key = view_lut_key
+
+        # --- 创建帧缓冲区用于离屏渲染 ---
+        fbo = graph.target('output', (output_width, output_height), 4, 'f1')
+
+        # --- 设置交织 pass 的输入与Uniform变量 ---
+        interlace = self.interlace
+        interlace.inputs['g_Texture1'] = 'color'
+        interlace.inputs['g_Texture2'] = 'depth_blur' if self.depth_blur.enabled else 'depth'
+        interlace.inputs['g_Texture3'] = 'color_blur' if self.color_blur.enabled else 'color'
+        interlace.inputs['u_ViewLut'] = 'view_lut'
+        interlace.uniforms.update({
+            'g_Texture1Resolution': (float(img_orig.shape[1]), float(img_orig.shape[0])),
+            'u_threshold': threshold,
+            'u_protrude': protrude,
+            # 视图内变换参数
+            'u_scaleX': scale_x,
+            'u_scaleY': scale_y,
+            'u_offsetX': offset_x,
+            'u_offsetY': offset_y,
+            # 深度图效果参数
+            'u_blurDepth': blur_depth,
+            # 边框效果参数
+            'u_borderColor': hex_to_rgb(border_color),
+            'u_borderSizeX': border_size_x,
+            'u_borderSizeY': border_size_y,
+        })
+
+        # --- 渲染 ---
+        graph.execute()
+        return fbo
+
+    def release(self):
+        # --- 清理资源 ---
+        self.graph.release()
+        for pbo in self._pbos:
+            if pbo is not None:
+                pbo.release()
+        for vao in [self.vao] + self.blur_vaos:
+            vao.release()
+        self.vbo.release()
+        for program in [self.program] + self.blur_programs:
+            program.release()
+        self.ctx.release()
+
+
+def create_renderer(vertex_shader_path="shaders/vertex_shader.glsl",
+                    fragment_shader_path="shaders/depth_fragment_shader.glsl",
+                    blur_shader_path="shaders/blur_fragment_shader.glsl",
+                    backend="auto"):
+    """
+    创建一个新的渲染器，由调用方负责 release。
+
+    backend: "gl" 使用 ModernGL；"cpu" 使用 NumPy 实现 (depth_render_cpu)；
+    "auto" 优先 ModernGL，无法创建上下文时（如无显卡的服务器）回退到 CPU。
+    """
+    if backend in ("auto", "gl"):
+        try:
+            return HologramRenderer(vertex_shader_path, fragment_shader_path, blur_shader_path)
+        except Exception as e:
+            if backend == "gl":
+                raise
+            print(f"创建ModernGL上下文时出错: {e}，改用 CPU 渲染。")
+    elif backend != "cpu":
+        raise ValueError(f"未知的渲染后端: {backend}")
+    from depth_render_cpu import CpuHologramRenderer
+    return CpuHologramRenderer()
+
+
+class RenderThread:
+    """
+    常驻渲染线程：进程内所有渲染器都在这一个线程中创建和调用。
+
+    ModernGL 上下文绑定在创建它的线程上，而流水线每次转换都会启动新的写出线程；
+    把渲染集中到常驻线程后，上下文和着色器在整个进程中只创建、编译一次，
+    其他线程通过 call 提交调用并等待结果。release_all 在渲染线程中释放全部渲染器。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._thread = None
+        self._renderers = {}
+
+    def call(self, key, method, *args, **kwargs):
+        """在渲染线程中调用 key 对应渲染器（不存在时创建）的 method，返回结果或重新抛出异常。"""
+        return self._submit(lambda: getattr(self._get(key), method)(*args, **kwargs))
+
+    def ensure(self, key):
+        """在渲染线程中创建 key 对应的渲染器（已存在时直接返回），创建失败时抛出异常。"""
+        self._submit(lambda: self._get(key))
+
+    def release_all(self):
+        """释放所有渲染器（之后再次调用时会重新创建）。"""
+        with self._lock:
+            if self._thread is None:
+                return
+        self._submit(self._release_all)
+
+    def _submit(self, fn):
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hologram-render", daemon=True)
+                self._thread.start()
+            self._tasks.put((fn, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            fn, future = self._tasks.get()
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _get(self, key):
+        renderer = self._renderers.get(key)
+        if renderer is None:
+            renderer = self._renderers[key] = create_renderer(*key)
+        return renderer
+
+    def _release_all(self):
+        renderers, self._renderers = self._renderers, {}
+        for renderer in renderers.values():
+            renderer.release()
+
+
+_render_thread = RenderThread()
+
+
+class SharedRenderer:
+    """
+    get_renderer 返回的渲染器句柄，接口同 HologramRenderer，调用转发到常驻渲染线程。
+
+    帧序列（begin_sequence / push_frame / end_sequence）的状态保存在共享渲染器上，
+    同一组着色器同一时间只能进行一个帧序列。
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def render(self, *args, **kwargs):
+        return _render_thread.call(self.key, 'render', *args, **kwargs)
+
+    def begin_sequence(self):
+        return _render_thread.call(self.key, 'begin_sequence')
+
+    def push_frame(self, *args, **kwargs):
+        return _render_thread.call(self.key, 'push_frame', *args, **kwargs)
+
+    def end_sequence(self):
+        return _render_thread.call(self.key, 'end_sequence')
+
+    def render_sequence(self, frames, **params):
+        """同 HologramRenderer.render_sequence，逐帧提交到渲染线程。"""
+        self.begin_sequence()
+        for image, depth in frames:
+            output_image = self.push_frame(image, depth, **params)
+            if output_image is not None:
+                yield output_image
+        output_image = self.end_sequence()
+        if output_image is not None:
+            yield output_image
+
+
+def get_renderer(vertex_shader_path="shaders/vertex_shader.glsl",
+                 fragment_shader_path="shaders/depth_fragment_shader.glsl",
+                 blur_shader_path="shaders/blur_fragment_shader.glsl",
+                 backend="auto"):
+    """
+    返回进程内共享的渲染器（首次使用时在常驻渲染线程中创建），可在任意线程中调用。
+    backend 同 create_renderer。
+    """
+    key = (vertex_shader_path, fragment_shader_path, blur_shader_path, backend)
+    _render_thread.ensure(key)
+    return SharedRenderer(key)
+
+
+def release_renderers():
+    """释放所有共享渲染器的 OpenGL 资源，程序退出前调用。"""
+    _render_thread.release_all()
+
+
 def run_hologram_render(
-    image_file="input.jpg",
-    depth_file="depth.png",
-    output_file="output_hologram.png",
-    output_width=1440,
-    output_height=2560,
-    threshold=15.0,
-    protrude=0,
-    line_number=19.61603,
-    obliquity=0.101593,
-    deviation=15.83299625,
-    scale_x=1.0,
-    scale_y=1.0,
-    offset_x=0.0,
-    offset_y=0.0,
-    blur_size=5.0,
-    blur_depth=0.25,
-    depth_image_blur_size=50.0,
-    border_color="#FFFFFF",
-    border_size_x=0.02,
-    border_size_y=0.01,
     vertex_shader_path="shaders/vertex_shader.glsl",
-    fragment_shader_path="shaders/depth_fragment_shader.glsl"
+    fragment_shader_path="shaders/depth_fragment_shader.glsl",
+    blur_shader_path="shaders/blur_fragment_shader.glsl",
+    backend="auto",
+    **params
 ):
-    # 创建ModernGL上下文 (离屏渲染)
+    """渲染一张交织图，复用进程内共享的渲染器。参数见 HologramRenderer.render。"""
     try:
-        ctx = moderngl.create_context(standalone=True)
-        print("OpenGL context created.")
+        renderer = get_renderer(vertex_shader_path, fragment_shader_path, blur_shader_path, backend)
     except Exception as e:
         print(f"创建ModernGL上下文时出错: {e}")
-        print("这可能是因为没有找到兼容的OpenGL驱动程序，或者在没有显示功能的环境中运行。")
-        sys.exit(1)
-
-    # --- 加载图像 ---
-    try:
-        img_orig = Image.open(image_file).convert('RGBA')
-        img_depth = Image.open(depth_file).convert('RGBA')
-        print(f"Loaded quilt image: {image_file} ({img_orig.width}x{img_orig.height})")
-        print(f"Loaded depth image: {depth_file} ({img_depth.width}x{img_depth.height})")
-        # 创建纹理
-        # g_Texture1 (原始图像, quilt)
-        texture_image = ctx.texture(img_orig.size, 4, img_orig.tobytes())
-        texture_image.filter = (moderngl.LINEAR, moderngl.LINEAR) # 线性过滤
-        texture_image.repeat_x = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
-        texture_image.repeat_y = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
-        texture_image.use(1)
-        
-        # g_Texture2 (深度图)
-        texture_depth = ctx.texture(img_depth.size, 4, img_depth.tobytes())
-        texture_depth.filter = (moderngl.LINEAR, moderngl.LINEAR) # 线性过滤
-        texture_depth.repeat_x = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
-        texture_depth.repeat_y = False  # 相当于 CLAMP_TO_EDGE (边缘钳制)
-        texture_depth.use(2)
-    except FileNotFoundError as e:
-        print(f"错误: {e}. 请检查图像文件路径。")
-        return
-    except Exception as e:
-        print(f"加载图像时出错: {e}")
-        return
-
-    # --- 创建帧缓冲区用于离屏渲染 ---
-    # 创建一个纹理作为渲染目标
-    render_texture = ctx.texture((output_width, output_height), 4) # RGBA纹理
-
-    # 创建一个帧缓冲区对象并将渲染纹理附加到它
-    fbo = ctx.framebuffer(render_texture)
-
-    # 绑定帧缓冲区，以便渲染到它
-    fbo.use()
-    ctx.viewport = (0, 0, output_width, output_height) # 设置视口
-    ctx.clear(0.0, 0.0, 0.0, 1.0) # 清空帧缓冲区 (黑色，不透明)
-
-    # --- 加载着色器 ---
-    vertex_shader_source = load_shader_code(vertex_shader_path)
-    fragment_shader_source = load_shader_code(fragment_shader_path)
-
-    program = ctx.program(
-        vertex_shader=vertex_shader_source,
-        fragment_shader=fragment_shader_source,
-    )
-
-
-    # --- 设置几何体 (全屏四边形) ---
-    # 顶点数据: x, y, z, u, v
-    vertices = np.array([
-        -1.0, -1.0, 0.0, 0.0, 1.0,  # 左下角
-         1.0, -1.0, 0.0, 1.0, 1.0,  # 右下角
-        -1.0,  1.0, 0.0, 0.0, 0.0,  # 左上角
-         1.0,  1.0, 0.0, 1.0, 0.0   # 右上角
-    ], dtype='f4') # 'f4' 表示 float32
-
-    vbo = ctx.buffer(vertices)
-    
-    # 定义顶点缓冲区数据如何映射到着色器属性
-    vao = ctx.vertex_array(program, [(vbo, '3f 2f', 'a_Position', 'a_TexCoord')])
-
-    # --- 设置Uniform变量 ---
-    # 分配纹理单元
-    program['g_Texture1'].value = 1 # texture_image 将使用纹理单元1
-    program['g_Texture2'].value = 2 # texture_depth 将使用纹理单元2
-
-
-    # 设置来自argparse参数的uniform变量
-    program['g_Screen'].value = (float(output_width), float(output_height), 1.0)
-    program['g_Texture1Resolution'].value = (float(img_orig.width), float(img_orig.height))
-    program['u_threshold'].value = threshold
-    program['u_protrude'].value = protrude
-    program['u_lineNumber'].value = line_number
-    program['u_obliquity'].value = obliquity
-    program['u_Deviation'].value = deviation
-
-     # 视图内变换参数
-    program['u_scaleX'].value = scale_x
-    program['u_scaleY'].value = scale_y
-    program['u_offsetX'].value = offset_x
-    program['u_offsetY'].value = offset_y
-
-    # 深度图效果参数
-    program['u_blurSize'].value = blur_size
-    program['u_blurDepth'].value = blur_depth
-    program['u_depthImageBlurSize'].value = depth_image_blur_size
-
-    # 边框效果参数
-    border_color_rgb = hex_to_rgb(border_color)
-    program['u_borderColor'].value = border_color_rgb
-    program['u_borderSizeX'].value = border_size_x
-    program['u_borderSizeY'].value = border_size_y
-
-    # --- 渲染 ---
-    vao.render(moderngl.TRIANGLE_STRIP) # 使用三角形带模式渲染全屏四边形
-
-    # --- 读取像素并保存图像 ---
-    image_data = fbo.read(components=4, dtype='f1') # 'f1' 表示8位无符号整数 (字节)
-    
-    # 将字节数据转换为PIL图像
-    output_image = Image.frombytes('RGBA', (output_width, output_height), image_data)
-    
-    # 翻转图像，因为OpenGL的Y轴原点在左下角，PIL的Y轴原点在左上角
-    output_image = output_image.transpose(Image.FLIP_TOP_BOTTOM)
-    
-    output_image.save(output_file, compress_level=1)
-    print(f"Rendered image saved to {output_file}")
-
-    # --- 清理资源 ---
-    # 在独立上下文中，资源通常在脚本退出时自动清理。
-    # 如果上下文不退出，显式释放是良好的实践。
-    fbo.release()
-    render_texture.release()
-    texture_image.release()
-    texture_depth.release()
-    vbo.release()
-    vao.release()
-    program.release()
-    ctx.release()
+        print("这可能是因为没有找到兼容的OpenGL驱动程序，或者在没有显示功能的环境中运行。可使用 --backend cpu。")
+        raise
+    return renderer.render(**params)
 
 def load_config_yaml(yaml_path):
     if not os.path.exists(yaml_path):
@@ -204,6 +734,8 @@ def main():
     parser.add_argument('--border_size_y', type=float, help="垂直边框尺寸 (u_borderSizeY)")
     parser.add_argument('--vertex_shader_path', type=str, default="shaders/vertex_shader.glsl", help="顶点着色器文件路径")
     parser.add_argument('--fragment_shader_path', type=str, default="shaders/depth_fragment_shader.glsl", help="片元着色器文件路径")
+    parser.add_argument('--blur_shader_path', type=str, default="shaders/blur_fragment_shader.glsl", help="模糊 pass 片元着色器文件路径")
+    parser.add_argument('--backend', type=str, choices=['auto', 'gl', 'cpu'], help="渲染后端：auto（默认，优先 OpenGL）、gl、cpu（NumPy，无需显卡）")
     args = parser.parse_args()
     config = load_config_yaml(args.config)
 
@@ -212,7 +744,11 @@ def main():
     for k, v in vars(args).items():
         if v is not None and k != 'config':
             params[k] = v
-    run_hologram_render(**params)
+    params.setdefault('output_file', "output_hologram.png")
+    try:
+        run_hologram_render(**params)
+    finally:
+        release_renderers()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
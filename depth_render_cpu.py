@@ -0,0 +1,242 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from depth_render import (
+    BOX_KERNEL, GAUSSIAN_KERNEL, QUILT_SIZE,
+    hex_to_rgb, load_color_array, load_depth_array, load_view_lut,
+)
+from image_io import write_image
+
+
+def _to_unit(image):
+    """按 OpenGL 归一化纹理的规则把 uint8/uint16/float32 数组转换为 float32。"""
+    if image.dtype == np.uint8:
+        return image.astype(np.float32) / np.float32(255.0)
+    if image.dtype == np.uint16:
+        return image.astype(np.float32) / np.float32(65535.0)
+    return image.astype(np.float32)
+
+
+def _quantize_unorm8(values):
+    """模拟写入 RGBA8 纹理：截断到 0-1 后四舍五入为 8 位。"""
+    return np.floor(np.clip(values, 0.0, 1.0) * np.float32(255.0) + np.float32(0.5))
+
+
+def sample_bilinear(plane, u, v):
+    """在 (H, W) 平面上按 GL_LINEAR + CLAMP_TO_EDGE 规则采样，u/v 为纹理坐标数组。"""
+    height, width = plane.shape
+    x = u * np.float32(width) - np.float32(0.5)
+    y = v * np.float32(height) - np.float32(0.5)
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = x - x0
+    fy = y - y0
+    x0 = x0.astype(np.intp)
+    y0 = y0.astype(np.intp)
+    x1 = np.clip(x0 + 1, 0, width - 1)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    np.clip(x0, 0, width - 1, out=x0)
+    np.clip(y0, 0, height - 1, out=y0)
+    top = plane[y0, x0] * (1 - fx) + plane[y0, x1] * fx
+    bottom = plane[y1, x0] * (1 - fx) + plane[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def _shift_axis(plane, shift, axis):
+    """沿 axis 以 shift 个纹素的常量偏移做线性插值采样（边缘钳制）。"""
+    size = plane.shape[axis]
+    whole = int(np.floor(shift))
+    frac = np.float32(shift - whole)
+    index = np.arange(size) + whole
+    first = np.take(plane, np.clip(index, 0, size - 1), axis=axis)
+    if frac == 0:
+        return first
+    second = np.take(plane, np.clip(index + 1, 0, size - 1), axis=axis)
+    return first * (1 - frac) + second * frac
+
+
+def convolve3x3(plane, kernel, step_x, step_y):
+    """
+    模糊 pass 的 CPU 版本：在每个纹素中心做 3x3 采样卷积，
+    相邻采样点相距 (step_x, step_y) 个 uv 单位，与 blur_fragment_shader.glsl 一致。
+    """
+    height, width = plane.shape
+    result = np.zeros_like(plane)
+    for x in range(3):
+        shifted = _shift_axis(plane, (x - 1) * step_x * width, axis=1)
+        for y in range(3):
+            # mat3 按列主序构造，kernel[x][y] 对应第 3x+y 个元素
+            result += _shift_axis(shifted, (y - 1) * step_y * height, axis=0) * np.float32(kernel[3 * x + y])
+    return result
+
+
+def _mirrored(v):
+    m = np.mod(v, np.float32(2.0))
+    return np.where(m >= 1.0, np.float32(2.0) - m, m)
+
+
+class CpuHologramRenderer:
+    """
+    纯 NumPy 向量化实现的交织渲染器，接口与 HologramRenderer 相同。
+
+    逐步复现 GPU 渲染路径：深度 box 模糊 pass、彩色高斯模糊 pass（结果按 RGBA8 量化），
+    再对每个子像素查视图索引表、计算深度驱动的 x 偏移、边框与模糊选择，最后逐通道交织。
+    交织按行带拆分到线程池中执行。无需 OpenGL，可在无显卡的服务器上运行，
+    也可作为 GL 渲染结果的参考实现（差异仅来自 GPU 插值精度）。
+    """
+
+    def __init__(self, workers=None, lut_cache_dir="cache/view_lut", band_rows=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.lut_cache_dir = lut_cache_dir
+        self.band_rows = band_rows
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._view_lut_key = None
+        self._view_lut = None
+
+    def render(
+        self,
+        image_file="input.jpg",
+        depth_file="depth.png",
+        output_file=None,
+        output_width=1440,
+        output_height=2560,
+        threshold=15.0,
+        protrude=0,
+        line_number=19.61603,
+        obliquity=0.101593,
+        deviation=15.83299625,
+        scale_x=1.0,
+        scale_y=1.0,
+        offset_x=0.0,
+        offset_y=0.0,
+        blur_size=5.0,
+        blur_depth=0.25,
+        depth_image_blur_size=50.0,
+        border_color="#FFFFFF",
+        border_size_x=0.02,
+        border_size_y=0.01,
+    ):
+        """参数与返回值同 HologramRenderer.render。"""
+        try:
+            img_orig = load_color_array(image_file)
+            img_depth = load_depth_array(depth_file)
+        except FileNotFoundError as e:
+            print(f"错误: {e}. 请检查图像文件路径。")
+            return None
+        except Exception as e:
+            print(f"加载图像时出错: {e}")
+            return None
+
+        color = [_to_unit(img_orig[:, :, c]) for c in range(3)]
+        depth = _to_unit(img_depth)
+
+        # 模糊 pass：深度结果为 R32F，彩色结果写入 RGBA8
+        if depth_image_blur_size >= 1.0:
+            depth = convolve3x3(depth, BOX_KERNEL,
+                                depth_image_blur_size / output_width, depth_image_blur_size / output_height)
+        if blur_size >= 1.0:
+            blurred = list(self._executor.map(
+                lambda plane: _quantize_unorm8(convolve3x3(plane, GAUSSIAN_KERNEL,
+                                                           blur_size / output_width,
+                                                           blur_size / output_height)) / np.float32(255.0),
+                color))
+        else:
+            blurred = color
+
+        view_lut_key = (output_width, output_height, line_number, obliquity, deviation)
+        if view_lut_key != self._view_lut_key:
+            self._view_lut = load_view_lut(*view_lut_key, cache_dir=self.lut_cache_dir)
+            self._view_lut_key = view_lut_key
+
+        params = {
+            'color': color,
+            'blurred': blurred,
+            'depth': depth,
+            'resolution': (img_orig.shape[1], img_orig.shape[0]),
+            'output_size': (output_width, output_height),
+            'threshold': np.float32(threshold),
+            'protrude': np.float32(protrude),
+            'scale': (np.float32(scale_x), np.float32(scale_y)),
+            'offset': (np.float32(offset_x), np.float32(offset_y)),
+            'blur_depth': np.float32(blur_depth),
+            'border_color': hex_to_rgb(border_color),
+            'border_size': (np.float32(border_size_x), np.float32(border_size_y)),
+        }
+        output_image = np.empty((output_height, output_width, 4), dtype=np.uint8)
+        output_image[:, :, 3] = 255
+        bands = [(row, min(row + self.band_rows, output_height)) for row in range(0, output_height, self.band_rows)]
+        for _ in self._executor.map(lambda band: self._interlace_band(output_image, band, params), bands):
+            pass
+
+        if output_file is not None:
+            write_image(output_file, output_image) # 格式按扩展名推断 (png/webp/bmp/ppm/npy)
+            print(f"Rendered image saved to {output_file}")
+        return output_image
+
+    def begin_sequence(self):
+        """帧序列接口，与 HologramRenderer 一致。"""
+
+    def push_frame(self, image_file, depth_file, **params):
+        """CPU 渲染是同步的，直接返回当前帧；加载图像失败时抛出 ValueError。"""
+        output_image = self.render(image_file, depth_file, **params)
+        if output_image is None:
+            raise ValueError("加载帧图像失败")
+        return output_image
+
+    def end_sequence(self):
+        return None
+
+    def render_sequence(self, frames, **params):
+        """依次渲染 frames 中的 (image, depth)，逐帧产出 RGBA 数组。"""
+        for image, depth in frames:
+            yield self.push_frame(image, depth, **params)
+
+    def _interlace_band(self, output_image, band, params):
+        """计算输出图像 [start, stop) 行，对应片元着色器的 main()/texArr()/depthQuilts()。"""
+        start, stop = band
+        f = np.float32
+        output_width, output_height = params['output_size']
+        quilt_x, quilt_y = f(QUILT_SIZE[0]), f(QUILT_SIZE[1])
+        scale_x, scale_y = params['scale']
+        offset_x, offset_y = params['offset']
+        border_x, border_y = params['border_size']
+
+        # 像素中心的纹理坐标，v 从图像顶部开始
+        u = ((np.arange(output_width, dtype=f) + f(0.5)) / f(output_width))[None, :]
+        v = ((np.arange(start, stop, dtype=f) + f(0.5)) / f(output_height))[:, None]
+
+        for channel in range(3):
+            z = self._view_lut[start:stop, :, channel].astype(f)
+
+            # texArr：视图索引 -> quilt 坐标
+            iuv_x = (np.mod(z, quilt_x) + u) / quilt_x
+            iuv_y = (np.floor(z / quilt_x) + v) / quilt_y
+
+            # depthQuilts
+            coord_x, coord_y = iuv_x * quilt_x, iuv_y * quilt_y
+            fract_x, fract_y = coord_x - np.floor(coord_x), coord_y - np.floor(coord_y)
+            image_id = np.floor(coord_x) + np.floor(coord_y) * quilt_x
+            value_id = image_id / (quilt_x * quilt_y - f(1.0))
+
+            uv_x = scale_x * (fract_x - f(0.5)) + f(0.5) + offset_x
+            uv_y = scale_y * (fract_y - f(0.5)) + f(0.5) + offset_y
+
+            depth = sample_bilinear(params['depth'], uv_x, uv_y)
+            x_offset = (depth - (f(0.0) - params['protrude']) - f(0.5)) * ((value_id - f(0.5)) * f(2.0) / params['threshold'])
+            fake_x = uv_x + x_offset
+
+            blurred = sample_bilinear(params['blurred'][channel], _mirrored(fake_x), _mirrored(uv_y))
+            sharp = sample_bilinear(params['color'][channel], fake_x, uv_y)
+            value = np.where(depth < params['blur_depth'], blurred, sharp)
+
+            border = np.where(value_id > 0.5, x_offset < 0, x_offset > 0) & (
+                (fract_x < border_x) | (fract_y < border_y) |
+                (fract_x > f(1.0) - border_x) | (fract_y > f(1.0) - border_y))
+            value = np.where(border, f(params['border_color'][channel]), value)
+
+            output_image[start:stop, :, channel] = _quantize_unorm8(value)
+
+    def release(self):
+        self._executor.shutdown()
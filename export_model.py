@@ -0,0 +1,117 @@
+import argparse
+import os
+import time
+
+import torch
+
+from depth_anything_v2.dinov2_layers import get_attention_backend, set_attention_backend
+from depth_anything_v2.runtime import OnnxDepthAnything, TorchScriptDepthAnything
+from depth_model import load_model, model_configs
+
+# 导出时的示例输入 (高, 宽)：必须为 14 的倍数且与预训练网格 (518x518) 不同，
+# 否则位置编码插值会被跳过，导出的图只对 518x518 输入有效
+EXPORT_SHAPE = (518, 700)
+
+# 一致性检查使用的输入尺寸（均为 14 的倍数，覆盖横竖构图和预训练尺寸）
+PARITY_SHAPES = [(518, 518), (518, 924), (924, 518), (364, 644)]
+
+
+def export_onnx(model, path, opset=17):
+    """导出 ONNX，batch、高、宽均为动态维度（高宽须为 14 的倍数）。"""
+    sample = torch.randn(1, 3, *EXPORT_SHAPE)
+    torch.onnx.export(
+        model, sample, path,
+        input_names=['image'], output_names=['depth'],
+        dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'},
+                      'depth': {0: 'batch', 1: 'height', 2: 'width'}},
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+    return path
+
+
+def export_torchscript(model, path):
+    """以 torch.jit.trace 导出 TorchScript；形状运算被记录在图中，高宽同样可变。"""
+    sample = torch.randn(1, 3, *EXPORT_SHAPE)
+    traced = torch.jit.trace(model, sample, check_trace=False)
+    traced.save(path)
+    return path
+
+
+def check_parity(model, backend, shapes=PARITY_SHAPES, tolerance=1e-2):
+    """
+    在固定随机输入上比较导出模型与即时模式的输出。
+    误差按即时模式输出的取值范围归一化；返回每个尺寸的 (尺寸, 最大误差, 平均误差, 耗时比) 和是否全部通过。
+    """
+    generator = torch.Generator().manual_seed(0)
+    rows, passed = [], True
+    with torch.no_grad():
+        for shape in shapes:
+            x = torch.randn(1, 3, *shape, generator=generator)
+            start = time.perf_counter()
+            reference = model(x)
+            eager_time = time.perf_counter() - start
+            start = time.perf_counter()
+            output = backend.forward(x)
+            backend_time = time.perf_counter() - start
+            scale = float(reference.max() - reference.min()) or 1.0
+            error = (output.float() - reference).abs() / scale
+            max_error, mean_error = float(error.max()), float(error.mean())
+            passed &= max_error <= tolerance
+            rows.append((shape, max_error, mean_error, eager_time / backend_time))
+    return rows, passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 Depth Anything V2 为 ONNX / TorchScript，并与即时模式比对输出。")
+    parser.add_argument('-w', '--weights', type=str, action='append', required=True,
+                        help="编码器=权重路径，如 vitl=depth_anything_v2_vitl.safetensors，可重复指定。")
+    parser.add_argument('-o', '--output', type=str, default='exported', help="输出目录。")
+    parser.add_argument('--format', type=str, nargs='+', default=['onnx', 'torchscript'],
+                        choices=['onnx', 'torchscript'], help="导出格式。")
+    parser.add_argument('--opset', type=int, default=17, help="ONNX opset 版本。")
+    parser.add_argument('--threads', type=int, help="一致性检查时 ONNX Runtime 的线程数。")
+    parser.add_argument('--tolerance', type=float, default=1e-2, help="一致性检查允许的最大相对误差。")
+    parser.add_argument('--skip_check', action='store_true', help="跳过与即时模式的一致性检查。")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    # 导出使用显式 softmax 的注意力，分块/SDPA 路径依赖运行时的内存判断，不适合固化到图中
+    attention_backend = get_attention_backend()
+    set_attention_backend('naive')
+    failed = []
+    try:
+        for spec in args.weights:
+            encoder, weights_path = spec.split('=', 1)
+            if encoder not in model_configs:
+                parser.error(f"未知的编码器: {encoder}")
+            model = load_model(encoder, weights_path, 'cpu', 'fp32', backend='torch')
+            name = os.path.join(args.output, f"depth_anything_v2_{encoder}")
+            for fmt in args.format:
+                if fmt == 'onnx':
+                    path = export_onnx(model, name + '.onnx', args.opset)
+                else:
+                    path = export_torchscript(model, name + '.pt')
+                print(f"已导出 {path}")
+                if args.skip_check:
+                    continue
+                if fmt == 'onnx':
+                    backend = OnnxDepthAnything(path, args.threads)
+                else:
+                    backend = TorchScriptDepthAnything(path)
+                rows, passed = check_parity(model, backend, tolerance=args.tolerance)
+                print(f"{'shape':<12}{'max err':>10}{'mean err':>10}{'speedup':>9}")
+                for (height, width), max_error, mean_error, speedup in rows:
+                    print(f"{f'{height}x{width}':<12}{max_error:>10.5f}{mean_error:>10.6f}{speedup:>8.2f}x")
+                print(f"{encoder} {fmt}: {'一致' if passed else '超出容差'}")
+                if not passed:
+                    failed.append(path)
+    finally:
+        set_attention_backend(attention_backend)
+
+    if failed:
+        raise SystemExit(f"一致性检查未通过: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# 输出格式 -> 文件扩展名
+IMAGE_FORMATS = {
+    'png': '.png',   # 无损，压缩级别可调 (0-9)，级别越低越快
+    'webp': '.webp', # 无损 WebP
+    'bmp': '.bmp',   # 不压缩
+    'ppm': '.ppm',   # 不压缩（灰度写为 .pgm，无 alpha 通道）
+    'npy': '.npy',   # 原始数组，保留 dtype
+}
+
+
+# 深度图输出格式 -> (图像格式, 数据类型)
+# png8 / png16 为按最小/最大值归一化后的 8 / 16 位 PNG，npy 为模型输出的原始 float32 深度；
+# png16 与 npy 另外在 <name>.range.json 中记录归一化范围。
+DEPTH_FORMATS = {
+    'png8': ('png', np.uint8),
+    'png16': ('png', np.uint16),
+    'npy': ('npy', np.float32),
+}
+
+
+def format_from_path(path):
+    """根据扩展名推断输出格式，未知扩展名按 png 处理。"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.pgm':
+        return 'ppm'
+    for fmt, fmt_extension in IMAGE_FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    return 'png'
+
+
+def path_for_format(path, fmt):
+    """把 path 的扩展名替换为 fmt 对应的扩展名。"""
+    extension = IMAGE_FORMATS[fmt]
+    return os.path.splitext(path)[0] + extension
+
+
+def encode_image(image, fmt='png', png_level=1):
+    """
+    把 RGB/RGBA/灰度数组编码为 fmt 格式的字节串。
+
+    png/ppm 支持 uint8 与 uint16，webp/bmp 只支持 uint8；npy 原样保存数组。
+    """
+    if fmt == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, image)
+        return buffer.getvalue()
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图像格式: {fmt}")
+    if image.ndim == 3 and image.shape[2] == 4:
+        if fmt == 'ppm':
+            image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA)
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if fmt == 'png':
+        params = [cv2.IMWRITE_PNG_COMPRESSION, png_level]
+    elif fmt == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, 101] # 质量大于 100 时为无损
+    else:
+        params = []
+    extension = '.pgm' if fmt == 'ppm' and image.ndim == 2 else IMAGE_FORMATS[fmt]
+    ok, data = cv2.imencode(extension, image, params)
+    if not ok:
+        raise RuntimeError(f"编码 {fmt} 图像失败")
+    return data.tobytes()
+
+
+def range_sidecar_path(path):
+    """深度图 path 对应的归一化范围文件路径：<name>.range.json。"""
+    return os.path.splitext(path)[0] + '.range.json'
+
+
+def write_range_sidecar(path, depth_range):
+    """把深度图 path 的归一化范围 (min, max) 写入旁路 JSON 文件。"""
+    depth_min, depth_max = depth_range
+    with open(range_sidecar_path(path), 'w', encoding='utf-8') as f:
+        json.dump({'min': float(depth_min), 'max': float(depth_max)}, f)
+
+
+def read_range_sidecar(path):
+    """读取深度图 path 的归一化范围，没有旁路文件时返回 None。"""
+    try:
+        with open(range_sidecar_path(path), 'r', encoding='utf-8') as f:
+            depth_range = json.load(f)
+        return float(depth_range['min']), float(depth_range['max'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_depth_npy(path):
+    """
+    以内存映射方式读取原始深度 (.npy)，按旁路文件中的范围归一化为 0-1 的 float32。
+    没有旁路文件时使用数组自身的最小/最大值。
+    """
+    depth = np.load(path, mmap_mode='r')
+    depth_range = read_range_sidecar(path)
+    if depth_range is None:
+        depth_range = (float(depth.min()), float(depth.max()))
+    depth_min, depth_max = depth_range
+    scale = 1.0 / (depth_max - depth_min) if depth_max > depth_min else 0.0
+    return ((depth - np.float32(depth_min)) * np.float32(scale)).astype(np.float32)
+
+
+def write_image(path, image, fmt=None, png_level=1):
+    """同步编码并写出图像；fmt 为 None 时按扩展名推断。支持中文路径。"""
+    if fmt is None:
+        fmt = format_from_path(path)
+    data = encode_image(image, fmt, png_level)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+class ImageSink:
+    """
+    后台写图器：submit 只把数组放进线程池，编码与写盘在后台线程中完成，调用方不必等待压缩。
+
+    max_pending 限制尚未写完的图像数量（超过时 submit 阻塞），避免内存无限增长。
+    flush() 等待所有已提交的图像写完，并在调用线程中重新抛出后台出现的第一个错误。
+    同一个 sink 可以被多个线程同时使用。
+    """
+
+    def __init__(self, fmt='png', png_level=1, workers=2, max_pending=16):
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图像格式: {fmt}")
+        self.fmt = fmt
+        self.png_level = png_level
+        self._executor = ThreadPoolExecutor(max(1, workers))
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._error = None
+
+    def path_for(self, path, fmt=None):
+        """返回 path 按 fmt（默认为 sink 的格式）实际写出的路径。"""
+        return path_for_format(path, fmt or self.fmt)
+
+    def submit(self, path, image, fmt=None, depth_range=None):
+        """
+        提交一张图像，扩展名按格式替换，返回实际写出的路径。
+
+        image 在写完之前不能再被修改（不会复制）。depth_range 不为 None 时同时写出归一化范围旁路文件。
+        """
+        fmt = fmt or self.fmt
+        path = path_for_format(path, fmt)
+        self._slots.acquire()
+        future = self._executor.submit(self._write, path, image, fmt, depth_range)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return path
+
+    def _write(self, path, image, fmt, depth_range):
+        write_image(path, image, fmt, self.png_level)
+        if depth_range is not None:
+            write_range_sidecar(path, depth_range)
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+            if self._error is None and future.exception() is not None:
+                self._error = future.exception()
+        self._slots.release()
+
+    def flush(self):
+        """等待所有已提交的图像写完。"""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                break
+            for future in futures:
+                future.exception()
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,197 @@
+import queue
+import threading
+
+_END = object()
+
+
+class DepthPipeline:
+    """
+    三段式生产者/消费者流水线：解码线程池 -> 推理线程 -> 编码/写出线程池。
+
+    各阶段之间用有界队列连接，磁盘 I/O 和图像编码与模型前向并行执行，
+    同时限制内存中同时存在的样本数量。每个样本是一个 dict，各阶段函数
+    直接在样本上读写字段：
+      - decode_fn(sample): 在解码线程中调用，读取/预处理图像
+      - infer_fn(samples): 在唯一的推理线程中调用，一次处理最多 batch_size 个样本
+      - encode_fn(sample): 在编码线程中调用，编码并写出结果
+      - finish_fn(): 可选，每个编码线程处理完全部样本后在该线程中调用一次（如冲刷延迟输出、关闭编码器）
+    ordered=True 时只使用一个编码线程，并严格按输入顺序调用 encode_fn（用于视频）。
+
+    样本带有 'batch'（计划批次编号）和 'batch_len'（该批次的样本数）时，推理线程按编号凑批：
+    同一计划批次的样本凑齐后一起交给 infer_fn，不与其他批次混合（多个解码线程打乱顺序时也一样）；
+    没有编号的样本按到达顺序每 batch_size 个一批。
+    """
+
+    def __init__(self, decode_fn, infer_fn, encode_fn, decode_workers=2, encode_workers=2,
+                 batch_size=4, queue_size=8, ordered=False, finish_fn=None):
+        self.decode_fn = decode_fn
+        self.infer_fn = infer_fn
+        self.encode_fn = encode_fn
+        self.finish_fn = finish_fn
+        self.decode_workers = max(1, decode_workers)
+        self.encode_workers = 1 if ordered else max(1, encode_workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(queue_size, self.batch_size)
+        self.ordered = ordered
+
+    def run(self, samples, progress_callback=None, total=None):
+        """
+        处理 samples 中的所有样本，阻塞直到全部完成，返回完成的样本数。
+
+        progress_callback(current, total) 在调用线程中执行，可以安全地更新 GUI。
+        任一阶段抛出的异常会停止整条流水线并在调用线程中重新抛出。
+        """
+        if total is None and hasattr(samples, '__len__'):
+            total = len(samples)
+        self._stop = threading.Event()
+        self._error = None
+        decode_queue = queue.Queue(self.queue_size)
+        infer_queue = queue.Queue(self.queue_size)
+        encode_queue = queue.Queue(self.queue_size)
+        done_queue = queue.Queue()
+
+        threads = [threading.Thread(target=self._feed, args=(samples, decode_queue), daemon=True)]
+        threads += [threading.Thread(target=self._decode, args=(decode_queue, infer_queue), daemon=True)
+                    for _ in range(self.decode_workers)]
+        threads.append(threading.Thread(target=self._infer, args=(infer_queue, encode_queue), daemon=True))
+        threads += [threading.Thread(target=self._encode, args=(encode_queue, done_queue), daemon=True)
+                    for _ in range(self.encode_workers)]
+        for thread in threads:
+            thread.start()
+
+        current = 0
+        finished = 0
+        while finished < self.encode_workers and not self._stop.is_set():
+            try:
+                item = done_queue.get(timeout=0.1)
+            except queue.Empty:
+                if progress_callback is not None:
+                    progress_callback(current, total)
+                continue
+            if item is _END:
+                finished += 1
+                continue
+            current += 1
+            if progress_callback is not None:
+                progress_callback(current, total)
+
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+        return current
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, samples, decode_queue):
+        try:
+            for index, sample in enumerate(samples):
+                sample['index'] = index
+                if not self._put(decode_queue, sample):
+                    return
+        except BaseException as e:
+            self._fail(e)
+            return
+        for _ in range(self.decode_workers):
+            self._put(decode_queue, _END)
+
+    def _decode(self, decode_queue, infer_queue):
+        while True:
+            sample = self._get(decode_queue)
+            if sample is _END:
+                break
+            try:
+                self.decode_fn(sample)
+            except BaseException as e:
+                self._fail(e)
+                return
+            if not self._put(infer_queue, sample):
+                return
+        self._put(infer_queue, _END)
+
+    def _infer(self, infer_queue, encode_queue):
+        finished = 0
+        pending = {} # 批次编号 -> 尚未凑齐的样本；没有编号的样本归入 None
+        while finished < self.decode_workers:
+            sample = self._get(infer_queue)
+            if self._stop.is_set():
+                return
+            if sample is _END:
+                finished += 1
+                continue
+            key = sample.get('batch')
+            batch = pending.setdefault(key, [])
+            batch.append(sample)
+            if len(batch) >= (self.batch_size if key is None else sample['batch_len']):
+                del pending[key]
+                if not self._run_batch(batch, encode_queue):
+                    return
+        # 所有解码线程结束后，处理剩余的不完整批次
+        for batch in pending.values():
+            if not self._run_batch(batch, encode_queue):
+                return
+        for _ in range(self.encode_workers):
+            self._put(encode_queue, _END)
+
+    def _run_batch(self, batch, encode_queue):
+        try:
+            self.infer_fn(batch)
+        except BaseException as e:
+            self._fail(e)
+            return False
+        for sample in batch:
+            if not self._put(encode_queue, sample):
+                return False
+        return True
+
+    def _encode(self, encode_queue, done_queue):
+        pending = {}
+        next_index = 0
+        while True:
+            sample = self._get(encode_queue)
+            if sample is _END:
+                break
+            if not self.ordered:
+                ready = [sample]
+            else:
+                # 解码线程可能打乱顺序，按 index 重新排序后再写出
+                pending[sample['index']] = sample
+                ready = []
+                while next_index in pending:
+                    ready.append(pending.pop(next_index))
+                    next_index += 1
+            for sample in ready:
+                try:
+                    self.encode_fn(sample)
+                except BaseException as e:
+                    self._fail(e)
+                    return
+                done_queue.put(sample)
+        if self.finish_fn is not None and not self._stop.is_set():
+            try:
+                self.finish_fn()
+            except BaseException as e:
+                self._fail(e)
+                return
+        done_queue.put(_END)
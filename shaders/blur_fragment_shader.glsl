@@ -0,0 +1,21 @@
+#version 330 core
+
+// 3x3 卷积 pass：对整张输入纹理做一次模糊，结果写入中间 FBO，
+// 交织 pass 只需查表，不再对每个子像素重复采样 9 次。
+uniform sampler2D u_Source;
+uniform mat3 u_Kernel;
+uniform vec2 u_Step; // 相邻采样点之间的 uv 偏移 (size / g_Screen.xy)
+
+in vec2 v_TexCoord;
+out vec4 fragColor;
+
+void main() {
+    vec4 color = vec4(0., 0., 0., 0.);
+    for (int x = 0; x < 3; x++) {
+        for (int y = 0; y < 3; y++) {
+            vec2 offset = vec2(float(x - 1), float(y - 1)) * u_Step;
+            color += texture(u_Source, v_TexCoord + offset) * u_Kernel[x][y];
+        }
+    }
+    fragColor = color;
+}
@@ -1,14 +1,20 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageEnhance
+from PIL import Image
 import os
+import time
+from collections import Counter
 import cv2
-import torch
 import numpy as np
-from safetensors.torch import load_file
-from depth_anything_v2.dpt import DepthAnythingV2
 import yaml
-from depth_render import run_hologram_render
+from depth_render import load_depth_array, release_renderers, run_hologram_render
+from batch_planner import scan_images, plan_batches, read_image, read_inference_image
+from depth_anything_v2.dinov2_layers import set_attention_backend
+from depth_model import convert_depth, describe_model, load_model, normalize_depth
+from video_stream import read_first_frame, stream_depth_video
+from pipeline import DepthPipeline
+from depth_cache import DepthCache
+from image_io import DEPTH_FORMATS, ImageSink
 
 def set_center(window, width=300, height=150):
     x = (window.winfo_screenwidth() - width) / 2
@@ -62,7 +68,7 @@ class ImageConverterApp(ctk.CTk):
         # 添加复选框
         down_frame_batch = ctk.CTkFrame(self.tabview.tab("图像转换"), width=400, height=600)
         down_frame_batch.grid(row=1, column=0, columnspan=2, padx=20, pady=20)
-        down_frame_batch.columnconfigure((0, 1, 2), weight=1)
+        down_frame_batch.columnconfigure((0, 1, 2, 3, 4), weight=1)
 
         self.enhance_var = ctk.BooleanVar(value=False)
         enhance_checkbox = ctk.CTkCheckBox(down_frame_batch, text="增强图像饱和度", variable=self.enhance_var)
@@ -73,6 +79,14 @@ class ImageConverterApp(ctk.CTk):
         self.save_interlaced_var = ctk.BooleanVar(value=False)
         save_interlaced_checkbox = ctk.CTkCheckBox(down_frame_batch, text="生成交织图", variable=self.save_interlaced_var)
         save_interlaced_checkbox.grid(row=0, column=2, padx=5)
+        # 深度图格式：8 位 PNG / 16 位 PNG / 原始 float32 (.npy)
+        self.depth_format_var = ctk.StringVar(value="png8")
+        depth_format_menu = ctk.CTkOptionMenu(down_frame_batch, values=list(DEPTH_FORMATS), variable=self.depth_format_var, width=90)
+        depth_format_menu.grid(row=0, column=3, padx=5)
+        # 分块高清：在重叠分块上推理并与全局深度对齐融合，细节不再受输入分辨率限制
+        self.tiled_var = ctk.BooleanVar(value=False)
+        tiled_checkbox = ctk.CTkCheckBox(down_frame_batch, text="分块高清", variable=self.tiled_var)
+        tiled_checkbox.grid(row=0, column=4, padx=5)
 
         # 底部转换按钮
         convert_button = ctk.CTkButton(self.tabview.tab("图像转换"), text="转换", command=self.start_convert_image)
@@ -99,10 +113,12 @@ class ImageConverterApp(ctk.CTk):
     def start_convert_image(self):
         if self.source_image_path:
             target_image_path = os.path.splitext(self.source_image_path)[0] + "_depth.png"
+            depth_format = self.depth_format_var.get()
             # 处理图像
-            self.convert_image(self.source_image_path, target_image_path, input_size=int(self.slider.get()))
-            # 显示目标图像
-            image = Image.open(target_image_path)
+            self.convert_images([self.source_image_path], [target_image_path], input_size=int(self.slider.get()))
+            # 显示目标图像（16 位 / float 深度缩放到 8 位预览）
+            target_image_path = image_sink.path_for(target_image_path, DEPTH_FORMATS[depth_format][0])
+            image = Image.fromarray(normalize_depth(load_depth_array(target_image_path)))
             photo = ctk.CTkImage(image, size=(400, image.height * 400 // image.width))
             self.target_image_preview.configure(image=photo, text="")
             messagebox.showinfo("提示", "转换完成！")
@@ -151,39 +167,50 @@ class ImageConverterApp(ctk.CTk):
             self.preview_video(file_path)
     
     def preview_video(self, file_path):
-        # use ffmpeg to extract the all frame of the video
-        os.system("rmdir /s /q tmp && mkdir tmp")
-        os.system(f"ffmpeg -i {file_path} -vf fps=30 -qscale:v 2 tmp/%05d.jpg")
-        image = Image.open("tmp/00001.jpg")
+        # 只解码第一帧用于预览
+        frame = read_first_frame(file_path)
+        if frame is None:
+            messagebox.showerror("错误", "无法读取视频帧")
+            return
+        image = Image.fromarray(frame[:, :, ::-1])
         photo = ctk.CTkImage(image, size=(400, image.height * 400 // image.width))
         self.source_video_preview.configure(image=photo)
 
     def start_convert_video(self):
         if self.source_video_path:
             target_video_path = os.path.splitext(self.source_video_path)[0] + "_converted.mp4"
-            # convert tmp/%d.jpg to greyscale
+            input_size = int(self.video_slider.get())
+            options = self.get_convert_options()
+            interlaced_video_path = None
+            render_params = None
+            if options['save_interlaced']:
+                # 交织帧直接写入 ffmpeg 编码管道，不再逐帧保存 PNG
+                interlaced_video_path = os.path.splitext(self.source_video_path)[0] + "_interlaced.mp4"
+                render_params = load_config_yaml("tools/depth_config.yaml")
+
             self.show_progress_window()
-            total = len(os.listdir("tmp"))
-            self.progressbar.configure(determinate_speed=50.0/total)
             self.progress_callback(0, 100)
-            for file in os.listdir("tmp"):
-                file_path = os.path.join("tmp", file)
-                self.convert_image(file_path, file_path, input_size=int(self.video_slider.get()))
-                self.progressbar.step()
-                self.progressbar.update()
-            
+            start = time.time()
+            # ffmpeg 管道流式解码 -> 推理 -> 编码，不再抽帧到 tmp/
+            frames = stream_depth_video(model, self.source_video_path, target_video_path, input_size, batch_size,
+                                        preprocess=lambda frame: prepare_array(frame, options),
+                                        progress_callback=self.progress_callback, decode_workers=decode_workers,
+                                        interlaced_path=interlaced_video_path, render_params=render_params)
+            fps = frames / max(time.time() - start, 1e-6)
+
             self.target_video_preview.configure(text=os.path.basename(target_video_path))
-            # use ffmpeg to convert the frames to video
-            os.system(f"ffmpeg -y -i tmp/%05d.jpg -c:v libx264 -vf fps=30 {target_video_path}")
             self.progress_callback(100, 100)
             self.progress_window.destroy()
-            image = Image.open("tmp/00001.jpg")
-            photo = ctk.CTkImage(image, size=(400, image.height * 400 // image.width))
-            self.target_video_preview.configure(image=photo)
-            messagebox.showinfo("提示", "转换完成！")
+            frame = read_first_frame(target_video_path)
+            if frame is not None:
+                image = Image.fromarray(frame[:, :, ::-1])
+                photo = ctk.CTkImage(image, size=(400, image.height * 400 // image.width))
+                self.target_video_preview.configure(image=photo)
+            messagebox.showinfo("提示", f"转换完成！共 {frames} 帧，{fps:.2f} fps")
 
     def progress_callback(self, current, total):
-        self.progressbar.set(current/total*100)
+        if total:
+            self.progressbar.set(min(current / total, 1.0))
         self.progressbar.update()
     
     def select_source_directory(self, event):
@@ -210,21 +237,35 @@ class ImageConverterApp(ctk.CTk):
                 os.makedirs(self.target_directory)
             self.target_dir_label.configure(text=self.target_directory)
 
+        input_size = int(self.batch_slider.get())
+        # 递归扫描源目录，按推理尺寸分桶后逐批处理
+        image_paths = scan_images(self.source_directory, exclude=(self.target_directory,))
+        size_fn = crop_size_916 if self.force_916.get() else None
+        batches, skipped = plan_batches(image_paths, input_size, batch_size, size_fn)
+
+        image_paths = [file_path for batch in batches for file_path in batch]
+        batch_ids = [batch_id for batch_id, batch in enumerate(batches) for _ in batch]
+        save_paths = []
+        for file_path in image_paths:
+            relative_directory = os.path.relpath(os.path.dirname(file_path), self.source_directory)
+            target_directory = os.path.normpath(os.path.join(self.target_directory, relative_directory))
+            if not os.path.exists(target_directory):
+                os.makedirs(target_directory)
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            save_paths.append(os.path.join(target_directory, f"{file_name}_d.png"))
+
         self.show_progress_window()
-        self.progressbar.configure(determinate_speed=50.0/len(os.listdir(self.source_directory)))
         self.progress_callback(0, 100)
-
-        for file in os.listdir(self.source_directory):
-            file_path = os.path.join(self.source_directory, file)
-            if os.path.isfile(file_path) and file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-                target_file_path = os.path.join(self.target_directory, f"{os.path.splitext(file)[0]}_d.png")
-                self.convert_image(file_path, target_file_path, input_size=int(self.batch_slider.get()))
-                self.progressbar.step()
-                self.progressbar.update()
+        # 按分桶顺序送入流水线，推理线程按计划批次编号凑批，每个计划批次只做一次前向
+        self.convert_images(image_paths, save_paths, input_size=input_size,
+                            progress_callback=self.progress_callback, batch_ids=batch_ids)
 
         self.progress_callback(100, 100)
         self.progress_window.destroy()
-        messagebox.showinfo("提示", "批量转换完成！")
+        if skipped:
+            messagebox.showwarning("提示", f"批量转换完成，{len(skipped)} 个文件无法读取已跳过。")
+        else:
+            messagebox.showinfo("提示", "批量转换完成！")
 
     def batch_converter_tab(self):
         self.tabview.add("批量转换")
@@ -258,7 +299,7 @@ class ImageConverterApp(ctk.CTk):
         # 添加复选框
         down_frame_batch = ctk.CTkFrame(self.tabview.tab("批量转换"), width=400, height=600)
         down_frame_batch.grid(row=1, column=0, columnspan=2, padx=20, pady=20)
-        down_frame_batch.columnconfigure((0, 1, 2), weight=1)
+        down_frame_batch.columnconfigure((0, 1, 2, 3, 4), weight=1)
 
         enhance_checkbox = ctk.CTkCheckBox(down_frame_batch, text="增强图像饱和度", variable=self.enhance_var)
         enhance_checkbox.grid(row=0, column=0, padx=5)
@@ -266,6 +307,10 @@ class ImageConverterApp(ctk.CTk):
         force_916_checkbox.grid(row=0, column=1, padx=5)
         save_interlaced_checkbox = ctk.CTkCheckBox(down_frame_batch, text="生成交织图", variable=self.save_interlaced_var)
         save_interlaced_checkbox.grid(row=0, column=2, padx=5)
+        depth_format_menu = ctk.CTkOptionMenu(down_frame_batch, values=list(DEPTH_FORMATS), variable=self.depth_format_var, width=90)
+        depth_format_menu.grid(row=0, column=3, padx=5)
+        tiled_checkbox = ctk.CTkCheckBox(down_frame_batch, text="分块高清", variable=self.tiled_var)
+        tiled_checkbox.grid(row=0, column=4, padx=5)
 
         # 底部转换按钮
         convert_batch_button = ctk.CTkButton(self.tabview.tab("批量转换"), text="转换", command=self.start_convert_batch)
@@ -291,87 +336,232 @@ class ImageConverterApp(ctk.CTk):
         self.progress_window.deiconify()
         self.progress_window.update()
 
-    def convert_image(self, image_path, save_path, input_size=518):
-        save_directory = os.path.dirname(save_path)
-        if self.enhance_var.get() or self.force_916.get():
-            tmp_directory = save_directory + "/tmp/"
-            if not os.path.exists(tmp_directory):
-                os.makedirs(tmp_directory)
-            image = Image.open(image_path)
-            if self.enhance_var.get():
-                image = enhance_image(image)
-            if self.force_916.get():
-                width, height = image.size
-                # 计算9:16的目标高度
-                target_height = int(width * 16 / 9)
-                if target_height > height:
-                    # 如果目标高度大于原图高度，则以高度为基准，裁剪宽度
-                    target_width = int(height * 9 / 16)
-                    left = (width - target_width) // 2
-                    right = left + target_width
-                    top = 0
-                    bottom = height
-                    image = image.crop((left, top, right, bottom))
+    def get_convert_options(self):
+        # 在主线程读取 Tk 变量，工作线程只使用这里的快照
+        return {
+            'enhance': self.enhance_var.get(),
+            'force_916': self.force_916.get(),
+            'save_interlaced': self.save_interlaced_var.get(),
+            'depth_format': self.depth_format_var.get(),
+            'tiled': self.tiled_var.get(),
+        }
+
+    def convert_images(self, image_paths, save_paths, input_size=518, progress_callback=None, batch_ids=None):
+        """
+        通过流水线转换图像：解码线程池 -> 推理线程 -> 写出线程池。
+        解码/写出线程数由 decode_workers / encode_workers 控制。
+        batch_ids 为每张图片所属的计划批次编号（见 plan_batches），同一编号的图片一起推理。
+        PNG 等格式的压缩交给后台的 image_sink，返回前等待所有图像写完。
+        """
+        options = self.get_convert_options()
+        size_fn = crop_size_916 if options['force_916'] else None
+        # 深度在推理设备上归一化并量化，只把紧凑的结果传回主机：
+        # 只输出 8 位 PNG 时传 uint8；需要 16 位精度（png16、交织渲染、缓存）时传 uint16；npy 保留原始 float32
+        if options['depth_format'] == 'npy':
+            depth_dtype = None
+        elif options['depth_format'] == 'png8' and not options['save_interlaced'] and depth_cache is None:
+            depth_dtype = np.uint8
+        else:
+            depth_dtype = np.uint16
+        # npy 需要原始深度，缓存中也按 float32 保存（存储类型计入缓存键），避免命中后变成 16 位量化结果
+        cache_dtype = np.float32 if options['depth_format'] == 'npy' else None
+
+        def decode(sample):
+            # 大尺寸 JPEG 按推理尺寸缩小解码，深度图仍插值回原图（裁剪后）尺寸 source_size；分块推理时完整解码
+            image, (height, width), sample['reduction'] = read_inference_image(sample['source'], input_size, size_fn,
+                                                                               reduce=not options['tiled'])
+            # 增强/裁剪直接在内存数组上完成，不再写临时 JPEG
+            sample['image'] = prepare_array(image, options)
+            sample['source_size'] = (height, width) if size_fn is None else size_fn(width, height)[::-1]
+            if depth_cache is not None:
+                # 命中缓存的图像在推理阶段直接跳过
+                # 推理后端与精度（fp16/bf16/int8 等）的结果不同，也计入键
+                flags = {'enhance': options['enhance'], 'force_916': options['force_916'],
+                         'model': describe_model(model)}
+                if options['tiled']:
+                    flags['tiled'] = True
+                sample['cache_key'] = depth_cache.make_key(sample['image'], encoder, weights_digest, input_size, flags,
+                                                           dtype=cache_dtype)
+                cached = depth_cache.get(sample['cache_key'])
+                if cached is not None:
+                    sample['depth'], sample['depth_range'] = cached
+
+        def infer(samples):
+            pending = [sample for sample in samples if sample.get('depth') is None]
+            if pending:
+                if options['tiled']:
+                    # 分块推理：每张图的分块按 batch_size 组成批次
+                    depths = [model.infer_tiled(sample['image'], input_size, batch_size=batch_size, dtype=depth_dtype,
+                                                return_range=True, output_size=sample['source_size'])
+                              for sample in pending]
                 else:
-                    # 以宽度为基准，裁剪高度
-                    top = (height - target_height) // 2
-                    bottom = top + target_height
-                    left = 0
-                    right = width
-                    image = image.crop((left, top, right, bottom))
-            image_path = tmp_directory + os.path.splitext(os.path.basename(image_path))[0] + ".jpg"
-            image.save(image_path, quality=90)
-        gen_depth_image(image_path, save_path, input_size)
-        if self.save_interlaced_var.get():
-            config = load_config_yaml("tools/depth_config.yaml")
-            interlaced_directory = save_directory + "/interlaced/"
-            if not os.path.exists(interlaced_directory):
-                os.makedirs(interlaced_directory)
-            # 合并命令行参数覆盖yaml
-            params = dict(config)
-            params['image_file'] = image_path
-            params['depth_file'] = save_path
-            params['output_file'] = interlaced_directory + f"{os.path.splitext(os.path.basename(image_path))[0]}.png"
-            run_hologram_render(**params)
+                    depths = model.infer_images([sample['image'] for sample in pending], input_size, batch_size,
+                                                dtype=depth_dtype, return_range=True,
+                                                output_sizes=[sample['source_size'] for sample in pending])
+                for sample, (depth, depth_range) in zip(pending, depths):
+                    sample['depth'] = depth
+                    sample['depth_range'] = depth_range
+                    sample['cache_miss'] = True
+            for sample in samples:
+                # 缩小解码的图像不能用于交织，交织时在写出阶段再完整解码
+                if not options['save_interlaced'] or sample['reduction'] > 1:
+                    del sample['image']
+
+        def encode(sample):
+            depth = sample.pop('depth')
+            depth_range = sample.pop('depth_range')
+            if depth_cache is not None and sample.get('cache_miss'):
+                depth_cache.put(sample['cache_key'], depth, depth_range, dtype=cache_dtype)
+            save_depth_image(depth, sample['save_path'], options['depth_format'], depth_range)
+            if options['save_interlaced']:
+                # 彩色图与深度图直接以数组传给渲染器，16 位深度以 R16 纹理上传，不经过 8 位量化
+                name = os.path.splitext(os.path.basename(sample['source']))[0]
+                interlaced_directory = os.path.dirname(sample['save_path']) + "/interlaced/"
+                if depth.dtype.kind == 'f':
+                    depth = normalize_depth(depth, np.float32)
+                image = sample.pop('image', None)
+                if image is None:
+                    image = prepare_array(read_image(sample['source']), options)
+                save_interlaced(to_rgb(image), depth, interlaced_directory, name)
+
+        pipeline = DepthPipeline(decode, infer, encode, decode_workers=decode_workers,
+                                 encode_workers=encode_workers, batch_size=batch_size)
+        samples = [{'source': image_path, 'save_path': save_path}
+                   for image_path, save_path in zip(image_paths, save_paths)]
+        if batch_ids is not None:
+            batch_lens = Counter(batch_ids)
+            for sample, batch_id in zip(samples, batch_ids):
+                sample['batch'] = batch_id
+                sample['batch_len'] = batch_lens[batch_id]
+        count = pipeline.run(samples, progress_callback)
+        image_sink.flush()
+        return count
 
             
+def preprocess_ops(options):
+    """按勾选项返回依次作用于 BGR(A)/灰度数组的预处理操作。先裁剪（零拷贝视图）再增强，减少计算量。"""
+    ops = []
+    if options['force_916']:
+        ops.append(crop_916)
+    if options['enhance']:
+        ops.append(enhance_image)
+    return ops
+
+def prepare_array(image, options):
+    """对图像或视频帧（cv2 解码得到的数组）应用勾选的增强/裁剪，全部在内存中完成。"""
+    if image.dtype == np.uint16:
+        # 16 位 PNG 以 IMREAD_UNCHANGED 解码，取高 8 位，供推理和交织渲染使用
+        image = (image >> 8).astype(np.uint8)
+    for op in preprocess_ops(options):
+        image = op(image)
+    return image
+
+def save_interlaced(image, depth, interlaced_directory, name):
+    """image 为 RGB 数组，depth 为深度数组，交织图由 image_sink 在后台保存为 interlaced_directory/name.<interlaced_format>"""
+    config = load_config_yaml("tools/depth_config.yaml")
+    if not os.path.exists(interlaced_directory):
+        os.makedirs(interlaced_directory, exist_ok=True)
+    # 合并命令行参数覆盖yaml
+    params = dict(config)
+    params['image_file'] = image
+    params['depth_file'] = depth
+    params['output_file'] = None
+    output_image = run_hologram_render(**params)
+    if output_image is not None:
+        image_sink.submit(interlaced_directory + f"{name}.png", output_image, interlaced_format)
+
+def to_rgb(image):
+    """将 cv2 解码得到的 BGR/BGRA/灰度数组转换为 RGB"""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
 def load_config_yaml(yaml_path):
     if not os.path.exists(yaml_path):
         return {}
     with open(yaml_path, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
-def gen_depth_image(image_path, save_path, input_size=518):
-    raw_img = cv2.imdecode(np.fromfile(image_path,dtype=np.uint8),-1)
-
-    depth = model.infer_image(raw_img, input_size) # HxW raw depth map in numpy
-    depth_normalized = cv2.normalize(depth, None, 0, 255, cv2.NORM_MINMAX)
-    depth_normalized = depth_normalized.astype(np.uint8)
-
-    cv2.imencode('.png', depth_normalized)[1].tofile(save_path)
-
-def enhance_image(image):
-    # 提高image饱和度30%
-    enhancer = ImageEnhance.Color(image)
-    image = enhancer.enhance(1.3)
-    return image
+def save_depth_image(depth, save_path, depth_format="png8", depth_range=None):
+    """
+    按 depth_format 保存深度图：png8 / png16 为归一化后的 8 / 16 位 PNG，npy 为原始 float32 深度。
+    depth 可以是原始浮点深度，也可以是已归一化的 uint8/uint16 深度（此时 depth_range 为其原始范围）。
+    png16 / npy 同时写出归一化范围旁路文件 <name>.range.json。编码与写盘在 image_sink 的后台线程中完成。
+    """
+    fmt, dtype = DEPTH_FORMATS[depth_format]
+    if depth_range is None and depth.dtype.kind == 'f':
+        depth_range = (float(depth.min()), float(depth.max()))
+    image = convert_depth(depth, dtype, depth_range)
+    return image_sink.submit(save_path, image, fmt, None if depth_format == 'png8' else depth_range)
+
+def crop_box_916(width, height):
+    """返回居中裁剪为9:16的 (left, top, right, bottom)"""
+    # 计算9:16的目标高度
+    target_height = int(width * 16 / 9)
+    if target_height > height:
+        # 如果目标高度大于原图高度，则以高度为基准，裁剪宽度
+        target_width = int(height * 9 / 16)
+        left = (width - target_width) // 2
+        return (left, 0, left + target_width, height)
+    # 以宽度为基准，裁剪高度
+    top = (height - target_height) // 2
+    return (0, top, width, top + target_height)
+
+def crop_size_916(width, height):
+    left, top, right, bottom = crop_box_916(width, height)
+    return right - left, bottom - top
+
+def crop_916(image):
+    """居中裁剪为9:16，返回原数组的视图（不复制像素）"""
+    left, top, right, bottom = crop_box_916(image.shape[1], image.shape[0])
+    return image[top:bottom, left:right]
+
+def enhance_image(image, factor=1.3):
+    """
+    提高 BGR(A) 数组的饱和度（默认 30%），与 PIL ImageEnhance.Color 相同：
+    与灰度图 (ITU-R 601 亮度) 按 factor 外插并截断到 0-255。灰度图原样返回，alpha 通道保持不变。
+    """
+    if image.ndim == 2:
+        return image
+    color = image[:, :, :3]
+    gray = cv2.cvtColor(cv2.cvtColor(color, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+    enhanced = cv2.addWeighted(color, factor, gray, 1.0 - factor, 0)
+    if image.shape[2] == 4:
+        enhanced = np.dstack([enhanced, image[:, :, 3]])
+    return enhanced
 
 if __name__ == "__main__":
-    DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
     encoder = 'vitl' # or 'vits', 'vitb', 'vitl'
     #encoder = 'vitb'
+    batch_size = 4 # 批量/视频推理时每个batch的图像数量
+    decode_workers = 2 # 流水线解码/预处理线程数
+    encode_workers = 2 # 流水线编码/写出线程数
     depth_path = f'E:/AI/webui_forge_cu121_torch231/webui/models/ControlNetPreprocessor/depth_anything_v2/depth_anything_v2_{encoder}.safetensors'
+    # 推理精度：None 时 GPU 用 fp16、CPU 用 fp32；可选 "fp32"、"fp16"、"bf16"、"fp16-autocast"、"bf16-autocast"，
+    # 纯 CPU 节点可设为 "int8"（编码器线性层动态量化）
+    precision = None
+    # 注意力实现："auto" 按序列长度和可用内存自动选择；也可固定为 "naive"、"sdpa" 或 "chunked"
+    # （chunked 分块计算、峰值内存最低，适合内存有限的 CPU 机器使用大输入分辨率）
+    attention_backend = "auto"
+    set_attention_backend(attention_backend)
+    # 推理后端：None 时按 depth_path 扩展名选择（.safetensors 为 PyTorch，.onnx 为 ONNX Runtime CPU，.pt 为 TorchScript）；
+    # ONNX / TorchScript 模型由 export_model.py 导出，ort_threads 为 ONNX Runtime 线程数（None 为默认）
+    backend = None
+    ort_threads = None
     # 配置模型
-    model_configs = {
-        'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-        'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-        'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
-        'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
-    }
-
-    model = DepthAnythingV2(**model_configs[encoder])
-    model.load_state_dict(load_file(depth_path))
-    model = model.to(DEVICE).eval().half()
+    model = load_model(encoder, depth_path, precision=precision, backend=backend, threads=ort_threads)
+    # 深度缓存：相同图像/模型/推理尺寸/预处理选项不再重复推理，设为 None 可关闭
+    depth_cache = DepthCache("cache/depth", max_bytes=4 * 1024 ** 3)
+    weights_digest = depth_cache.weights_digest(depth_path) if depth_cache is not None else None
+    # 交织图格式：png（压缩级别 png_level，0-9）、webp（无损）、bmp / ppm（不压缩）、npy（原始数组）
+    # 深度图格式在界面中选择（png8 / png16 / npy）
+    interlaced_format = "png"
+    png_level = 1
+    image_sink = ImageSink(png_level=png_level, workers=encode_workers)
 
     app = ImageConverterApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    image_sink.close()
+    release_renderers()
\ No newline at end of file
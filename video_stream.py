@@ -0,0 +1,266 @@
+import argparse
+import json
+import subprocess
+import time
+
+import numpy as np
+
+from depth_model import convert_depth
+from depth_render import get_renderer, load_config_yaml, release_renderers
+from pipeline import DepthPipeline
+
+
+def probe_video(video_path):
+    """用 ffprobe 读取视频的宽、高、帧率和帧数（考虑旋转元数据）。"""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,r_frame_rate,nb_frames,duration:stream_tags=rotate:stream_side_data=rotation',
+        '-of', 'json', video_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    stream = json.loads(result.stdout)['streams'][0]
+
+    width, height = int(stream['width']), int(stream['height'])
+    rotation = int(stream.get('tags', {}).get('rotate', 0))
+    for side_data in stream.get('side_data_list', []):
+        rotation = int(side_data.get('rotation', rotation))
+    # ffmpeg 解码时会自动旋转，输出帧的宽高需要对调
+    if rotation % 180 != 0:
+        width, height = height, width
+
+    fps = stream.get('r_frame_rate', '30/1')
+    num, den = (float(x) for x in fps.split('/'))
+    frames = stream.get('nb_frames')
+    if frames is not None and frames.isdigit():
+        frames = int(frames)
+    elif 'duration' in stream and den:
+        frames = int(float(stream['duration']) * num / den)
+    else:
+        frames = None
+    return {'width': width, 'height': height, 'fps': fps, 'frames': frames}
+
+
+def read_frames(video_path, width, height):
+    """从 ffmpeg rawvideo 管道逐帧读取 BGR uint8 图像，内存占用只与单帧大小相关。"""
+    cmd = ['ffmpeg', '-v', 'error', '-i', video_path, '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+    frame_size = width * height * 3
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=frame_size)
+    try:
+        while True:
+            buffer = process.stdout.read(frame_size)
+            if len(buffer) < frame_size:
+                break
+            yield np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+
+def read_first_frame(video_path):
+    info = probe_video(video_path)
+    frames = read_frames(video_path, info['width'], info['height'])
+    try:
+        return next(frames, None)
+    finally:
+        frames.close()
+
+
+def open_encoder(output_path, width, height, fps, pix_fmt='gray', audio_source=None):
+    """
+    启动从 stdin 读取 rawvideo 的 ffmpeg 编码进程。
+
+    audio_source 不为 None 时从该文件复用音轨（没有音轨时忽略）。
+    """
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'rawvideo', '-pix_fmt', pix_fmt, '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+    ]
+    if audio_source is not None:
+        cmd += ['-i', audio_source, '-map', '0:v', '-map', '1:a?', '-c:a', 'aac']
+    cmd += [
+        # yuv420p 要求宽高为偶数
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', output_path,
+    ]
+    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+
+def close_encoder(encoder):
+    encoder.stdin.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg 编码失败，返回码 {encoder.returncode}")
+
+
+class InterlacedVideoWriter:
+    """
+    把彩色帧 + 深度帧渲染为交织图，直接以 rgb24 rawvideo 写入 ffmpeg 编码管道，不写逐帧 PNG。
+
+    渲染器为进程内共享、在常驻渲染线程中运行的 ModernGL 渲染器（见 depth_render.get_renderer），
+    使用双缓冲异步读回，同一时间只能有一个交织视频在写。输出保持源视频帧率，并复用 audio_source 的音轨。
+    render_params 为交织参数（同 depth_config.yaml），其中的文件路径项会被忽略。
+    """
+
+    def __init__(self, output_path, fps, render_params=None, audio_source=None, backend="auto"):
+        params = dict(render_params or {})
+        for key in ('image_file', 'depth_file', 'output_file'):
+            params.pop(key, None)
+        self.shader_paths = {key: params.pop(key) for key in
+                             ('vertex_shader_path', 'fragment_shader_path', 'blur_shader_path') if key in params}
+        self.backend = params.pop('backend', backend)
+        self.render_params = params
+        self.output_path = output_path
+        self.fps = fps
+        self.audio_source = audio_source
+        self.renderer = None
+        self.encoder = None
+        self.frames = 0
+
+    def write(self, image, depth):
+        """image 为 RGB 数组，depth 为深度数组；由于异步读回，编码比提交滞后一帧。"""
+        if self.renderer is None:
+            self.renderer = get_renderer(backend=self.backend, **self.shader_paths)
+            self.renderer.begin_sequence()
+        self._encode(self.renderer.push_frame(image, depth, **self.render_params))
+
+    def close(self):
+        """写出最后一帧并等待 ffmpeg 结束。"""
+        if self.renderer is not None:
+            self._encode(self.renderer.end_sequence())
+        if self.encoder is not None:
+            close_encoder(self.encoder)
+
+    def kill(self):
+        if self.encoder is not None:
+            self.encoder.kill()
+
+    def _encode(self, frame):
+        if frame is None:
+            return
+        if self.encoder is None:
+            self.encoder = open_encoder(self.output_path, frame.shape[1], frame.shape[0], self.fps,
+                                        'rgb24', audio_source=self.audio_source)
+        self.encoder.stdin.write(np.ascontiguousarray(frame[:, :, :3]))
+        self.frames += 1
+
+
+def stream_depth_video(model, video_path, output_path, input_size=518, batch_size=4,
+                       preprocess=None, frame_callback=None, progress_callback=None, decode_workers=2,
+                       interlaced_path=None, render_params=None):
+    """
+    流式生成深度视频：ffmpeg 解码管道 -> 批量深度推理 -> ffmpeg 编码管道。
+
+    不在磁盘上写任何中间帧，内存中的帧数受流水线队列长度限制。
+    preprocess(frame) 在解码线程中对每帧做增强/裁剪；frame_callback(index, frame, depth)
+    在每帧深度图写入编码器后按帧顺序调用；progress_callback(current, total) 在调用线程中汇报进度。
+    interlaced_path 不为 None 时同时用 render_params 渲染交织视频（见 InterlacedVideoWriter），
+    保留源视频的帧率和音轨。返回处理的帧数。
+    """
+    info = probe_video(video_path)
+    encoder = None
+    interlaced = None
+    if interlaced_path is not None:
+        interlaced = InterlacedVideoWriter(interlaced_path, info['fps'], render_params, audio_source=video_path)
+
+    def decode(sample):
+        if preprocess is not None:
+            sample['image'] = preprocess(sample['image'])
+
+    # 深度在推理设备上归一化量化后再传回：只输出深度视频时为 uint8，需要交织渲染时为 uint16
+    depth_dtype = np.uint8 if interlaced is None else np.uint16
+
+    def infer(samples):
+        depths = model.infer_images([sample['image'] for sample in samples], input_size, batch_size,
+                                    dtype=depth_dtype)
+        for sample, depth in zip(samples, depths):
+            sample['depth'] = depth
+
+    def encode(sample):
+        nonlocal encoder
+        quantized_depth = sample.pop('depth')
+        depth = convert_depth(quantized_depth, np.uint8)
+        if encoder is None:
+            encoder = open_encoder(output_path, depth.shape[1], depth.shape[0], info['fps'])
+        encoder.stdin.write(depth.tobytes())
+        frame = sample.pop('image')
+        if interlaced is not None:
+            # BGR -> RGB；交织渲染使用 16 位深度（R16 纹理）
+            interlaced.write(frame[:, :, ::-1], quantized_depth)
+        if frame_callback is not None:
+            frame_callback(sample['index'], frame, depth)
+
+    def finish():
+        # 交织渲染器与编码线程绑定，最后一帧也要在该线程中取回
+        if interlaced is not None:
+            interlaced.close()
+
+    pipeline = DepthPipeline(decode, infer, encode, decode_workers=decode_workers,
+                             batch_size=batch_size, ordered=True, finish_fn=finish)
+    samples = ({'image': frame} for frame in read_frames(video_path, info['width'], info['height']))
+    try:
+        frames = pipeline.run(samples, progress_callback, total=info['frames'])
+    except BaseException:
+        if encoder is not None:
+            encoder.kill()
+        if interlaced is not None:
+            interlaced.kill()
+        raise
+    if encoder is not None:
+        close_encoder(encoder)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式生成深度视频（无需抽帧到磁盘）。")
+    parser.add_argument('-i', '--input', type=str, required=True, help="输入视频路径。")
+    parser.add_argument('-o', '--output', type=str, required=True, help="输出深度视频路径。")
+    parser.add_argument('-w', '--weights', type=str, required=True, help="Depth Anything V2 权重 (.safetensors) 或导出模型 (.onnx / .pt) 路径。")
+    parser.add_argument('--encoder', type=str, default='vitl', choices=['vits', 'vitb', 'vitl', 'vitg'], help="编码器规格。")
+    parser.add_argument('--input_size', type=int, default=518, help="推理输入分辨率。")
+    parser.add_argument('--batch_size', type=int, default=4, help="每个batch的帧数。")
+    parser.add_argument('--decode_workers', type=int, default=2, help="解码/预处理线程数。")
+    parser.add_argument('--precision', type=str, choices=['fp32', 'fp16', 'bf16', 'fp16-autocast', 'bf16-autocast', 'int8'],
+                        help="推理精度（默认 GPU 为 fp16，CPU 为 fp32；int8 为 CPU 动态量化）。")
+    parser.add_argument('--attention', type=str, default='auto', choices=['auto', 'naive', 'sdpa', 'chunked'],
+                        help="注意力实现（默认按序列长度和可用内存自动选择；chunked 分块计算，峰值内存最低）。")
+    parser.add_argument('--model_backend', type=str, choices=['torch', 'onnx', 'torchscript'],
+                        help="推理后端（默认按权重文件扩展名选择；.onnx / .pt 由 export_model.py 导出）。")
+    parser.add_argument('--threads', type=int, help="ONNX Runtime 线程数。")
+    parser.add_argument('--interlaced', type=str, help="同时输出交织视频到该路径（保留帧率与音轨）。")
+    parser.add_argument('-c', '--config', type=str, default="depth_config.yaml", help="交织渲染参数配置 (YAML)。")
+    parser.add_argument('--backend', type=str, default='auto', choices=['auto', 'gl', 'cpu'], help="交织渲染后端。")
+    args = parser.parse_args()
+
+    from depth_anything_v2.dinov2_layers import set_attention_backend
+    from depth_model import load_model
+    set_attention_backend(args.attention)
+    model = load_model(args.encoder, args.weights, precision=args.precision, backend=args.model_backend,
+                       threads=args.threads)
+
+    start = time.time()
+    reported = 0
+
+    def report(current, total):
+        nonlocal reported
+        if current >= reported + 100 or (current == total and current != reported):
+            reported = current
+            print(f"{current}/{total or '?'} frames, {current / (time.time() - start):.2f} fps")
+
+    render_params = None
+    if args.interlaced:
+        render_params = dict(load_config_yaml(args.config) or {}, backend=args.backend)
+    try:
+        frames = stream_depth_video(model, args.input, args.output, args.input_size, args.batch_size,
+                                    progress_callback=report, decode_workers=args.decode_workers,
+                                    interlaced_path=args.interlaced, render_params=render_params)
+    finally:
+        release_renderers()
+    elapsed = time.time() - start
+    print(f"Saved {frames} frames to {args.output} ({frames / elapsed:.2f} fps)")
+    if args.interlaced:
+        print(f"Saved interlaced video to {args.interlaced}")
+
+
+if __name__ == "__main__":
+    main()